@@ -1,48 +1,479 @@
+"""
+Download the PDF filings linked from a saved BSE/NSE results page.
+
+Downloads run concurrently over one pooled HTTP session. Requests to each
+host go through a token bucket (HOST_RATES) instead of sleeping between
+files, and failed requests are retried with exponential backoff.
+
+Links are read with a streaming HTMLParser that stops at the end of the
+`result_list` table; a directory of saved pages is parsed in parallel.
+
+A manifest in the output folder records each URL's ETag / Last-Modified,
+size and SHA-256, so re-runs send conditional requests and skip unchanged
+files. Bodies are streamed to a .part file and renamed into place when
+complete; an interrupted download resumes from the .part file with an HTTP
+Range request. Links that would share a file name are saved under distinct
+names (see local_paths).
+"""
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
 from urllib.parse import urlparse, parse_qs
-from time import sleep
+import argparse
+import glob
+import hashlib
+import json
 import os
+import random
+import threading
+import time
+
 import requests
-from bs4 import BeautifulSoup
-
-html_file = "html/sample.html"
-output_folder = "pdf"
-os.makedirs(output_folder, exist_ok=True)
-
-with open(html_file, "r", encoding="utf-8") as f:
-    soup = BeautifulSoup(f, "html.parser")
-
-table = soup.find("table", id="result_list")
-if not table:
-    print("No table with id 'result_list' found.")
-    exit(1)
-
-links = table.find_all("a", href=True)
-
-for link in links:
-    url = link["href"]
-    if url.lower().endswith(".pdf"):
-        parsed_url = urlparse(url)
-        filename = None
-        # BSE: use Pname param
-        if "bseindia.com" in parsed_url.netloc:
-            pname = parse_qs(parsed_url.query).get("Pname") or parse_qs(
-                parsed_url.query
-            ).get("pname")
-            if pname:
-                filename = pname[0]
-        # NSE: use last path segment
-        if not filename:
-            filename = os.path.basename(parsed_url.path)
-        filepath = os.path.join(output_folder, filename)
-        print(f"Downloading {url} -> {filepath}")
+from requests.adapters import HTTPAdapter
+
+HTML_FILE = "html/sample.html"
+OUTPUT_FOLDER = "pdf"
+DOWNLOAD_WORKERS = int(os.getenv("PDF_DOWNLOAD_WORKERS", 8))
+# (requests per second, burst) allowed per exchange host; other hosts use
+# DEFAULT_RATE
+HOST_RATES = {
+    "bseindia.com": (float(os.getenv("BSE_REQUESTS_PER_SECOND", 1)), 3),
+    "nseindia.com": (float(os.getenv("NSE_REQUESTS_PER_SECOND", 1)), 3),
+}
+DEFAULT_RATE = (5.0, 5)
+MAX_RETRIES = 4
+BACKOFF_SECONDS = 2
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+TIMEOUT = 60
+CHUNK_SIZE = 64 * 1024
+PARSE_WORKERS = os.cpu_count() or 1
+MANIFEST_NAME = ".manifest.json"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, up to `burst` at once."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """One token bucket per host; exchange subdomains share their domain's bucket."""
+
+    def __init__(self, host_rates=HOST_RATES, default_rate=DEFAULT_RATE):
+        self.host_rates = host_rates
+        self.default_rate = default_rate
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def _key(self, host):
+        for domain in self.host_rates:
+            if host == domain or host.endswith("." + domain):
+                return domain
+        return host
+
+    def acquire(self, url):
+        key = self._key(urlparse(url).hostname or "")
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(*self.host_rates.get(key, self.default_rate))
+                self.buckets[key] = bucket
+        bucket.acquire()
+
+
+def make_session(workers=DOWNLOAD_WORKERS):
+    """A session whose connection pool can serve every worker thread at once."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=len(HOST_RATES) + 1, pool_maxsize=workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ResultLinkParser(HTMLParser):
+    """
+    Collects PDF hrefs inside table#result_list as the page is fed in;
+    `done` is set once that table is closed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.links = []
+        self.table_depth = 0
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done or tag not in ("table", "a"):
+            return
+        if tag == "table":
+            if self.table_depth or dict(attrs).get("id") == "result_list":
+                self.table_depth += 1
+        elif self.table_depth:
+            href = dict(attrs).get("href")
+            if href and href.lower().endswith(".pdf"):
+                self.links.append(href)
+
+    def handle_endtag(self, tag):
+        if tag == "table" and self.table_depth:
+            self.table_depth -= 1
+            self.done = not self.table_depth
+
+
+def iter_pdf_links(html_file, chunk_size=CHUNK_SIZE):
+    """
+    Yield the PDF links of a saved results page while reading it in chunks,
+    without reading past the end of the `result_list` table.
+    """
+    parser = ResultLinkParser()
+    with open(html_file, "r", encoding="utf-8") as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            parser.feed(chunk)
+            yield from parser.links
+            parser.links.clear()
+            if parser.done:
+                return
+    parser.close()
+    yield from parser.links
+
+
+def extract_pdf_links(html_file):
+    """PDF links in the `result_list` table of a saved results page."""
+    links = list(iter_pdf_links(html_file))
+    if not links:
+        print(f"No PDF links in a table with id 'result_list' found in {html_file}.")
+    return links
+
+
+def extract_pdf_links_from_dir(directory, workers=PARSE_WORKERS):
+    """PDF links of every saved .html/.htm page in a directory, parsed in parallel."""
+    html_files = sorted(
+        glob.glob(os.path.join(directory, "*.html"))
+        + glob.glob(os.path.join(directory, "*.htm"))
+    )
+    if len(html_files) < 2 or workers < 2:
+        return [link for path in html_files for link in extract_pdf_links(path)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [
+            link for links in pool.map(extract_pdf_links, html_files) for link in links
+        ]
+
+
+def benchmark_extraction(html_file, repeat=20):
+    """Compare the streaming parser with the previous BeautifulSoup version."""
+    import timeit
+    from bs4 import BeautifulSoup
+
+    def with_beautifulsoup():
+        with open(html_file, "r", encoding="utf-8") as f:
+            soup = BeautifulSoup(f, "html.parser")
+        table = soup.find("table", id="result_list")
+        return [
+            link["href"]
+            for link in table.find_all("a", href=True)
+            if link["href"].lower().endswith(".pdf")
+        ]
+
+    def with_streaming_parser():
+        return list(iter_pdf_links(html_file))
+
+    assert with_beautifulsoup() == with_streaming_parser()
+    for name, function in (
+        ("BeautifulSoup", with_beautifulsoup),
+        ("HTMLParser stream", with_streaming_parser),
+    ):
+        seconds = min(timeit.repeat(function, number=repeat, repeat=3)) / repeat
+        print(f"{name:<18} {seconds * 1000:8.2f} ms per page")
+
+
+def pdf_filename(url):
+    parsed_url = urlparse(url)
+    filename = None
+    # BSE: use Pname param
+    if "bseindia.com" in parsed_url.netloc:
+        query = parse_qs(parsed_url.query)
+        pname = query.get("Pname") or query.get("pname")
+        if pname:
+            filename = pname[0]
+    # NSE: use last path segment
+    if not filename:
+        filename = os.path.basename(parsed_url.path)
+    return filename
+
+
+def local_paths(urls, output_folder):
+    """
+    Map each distinct URL to the file it is saved as. URLs whose filename
+    was already taken (two filings with the same Pname, say) get a short
+    hash of the URL appended, so no two downloads share a file.
+    """
+    paths, taken = {}, set()
+    for url in urls:
+        if url in paths:
+            continue
+        filename = pdf_filename(url)
+        if filename.lower() in taken:
+            stem, ext = os.path.splitext(filename)
+            url_hash = hashlib.sha256(url.encode()).hexdigest()[:8]
+            filename = f"{stem}-{url_hash}{ext}"
+        taken.add(filename.lower())
+        paths[url] = os.path.join(output_folder, filename)
+    return paths
+
+
+class DownloadManifest:
+    """
+    URL -> {etag, last_modified, size, sha256, path} of completed downloads,
+    kept as JSON and rewritten atomically after every change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except ValueError as e:
+            print(f"Ignoring unreadable manifest {path}: {e}")
+            self.entries = {}
+
+    def get(self, url):
+        with self.lock:
+            return self.entries.get(url)
+
+    def set(self, url, entry):
+        with self.lock:
+            self.entries[url] = entry
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+def fetch(session, limiter, url, headers=None, stream=False):
+    """
+    GET a URL within the host's rate limit, retrying connection errors and
+    429/5xx responses with exponential backoff (or the server's Retry-After).
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire(url)
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            }
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            with open(filepath, "wb") as f:
-                f.write(response.content)
-        except Exception as e:
-            print(f"Failed to download {url}: {e}")
-        sleep(5)  # avoid rate limits
+            response = session.get(url, headers=headers, stream=stream, timeout=TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = BACKOFF_SECONDS * 2**attempt
+            print(f"Retrying {url} in {delay:.0f}s after error: {e}")
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                response.raise_for_status()
+                return response
+            response.close()
+            retry_after = response.headers.get("Retry-After", "")
+            delay = (
+                float(retry_after)
+                if retry_after.isdigit()
+                else BACKOFF_SECONDS * 2**attempt
+            )
+            print(f"Retrying {url} in {delay:.0f}s after HTTP {response.status_code}")
+        time.sleep(delay + random.uniform(0, 1))
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest
+
+
+def _request_headers(entry, filepath, part_path):
+    """Conditional and Range headers for what we already have on disk."""
+    # Byte ranges and sizes must refer to the file itself, not a gzip of it
+    headers = {"Accept-Encoding": "identity"}
+    entry = entry or {}
+    if os.path.exists(filepath) and os.path.getsize(filepath) == entry.get("size"):
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    partial = entry.get("partial") or {}
+    validator = partial.get("etag") or partial.get("last_modified")
+    if validator and os.path.exists(part_path) and os.path.getsize(part_path) > 0:
+        headers["Range"] = f"bytes={os.path.getsize(part_path)}-"
+        # Only resume if the file hasn't changed since the .part was started
+        headers["If-Range"] = validator
+    return headers
+
+
+def download_pdf(session, limiter, manifest, url, filepath):
+    """
+    Download url to filepath unless the manifest shows it is unchanged.
+    Returns "unchanged", "downloaded" or "resumed".
+    """
+    part_path = f"{filepath}.part"
+    entry = manifest.get(url) or {}
+    headers = _request_headers(entry, filepath, part_path)
+    try:
+        response = fetch(session, limiter, url, headers=headers, stream=True)
+    except requests.HTTPError as e:
+        if (
+            e.response is None
+            or e.response.status_code != 416
+            or "Range" not in headers
+        ):
+            raise
+        # The .part file is no prefix of the server's copy; start over
+        del headers["Range"], headers["If-Range"]
+        response = fetch(session, limiter, url, headers=headers, stream=True)
+
+    with response:
+        if response.status_code == 304:
+            return "unchanged"
+
+        offset = os.path.getsize(part_path) if "Range" in headers else 0
+        content_range = response.headers.get("Content-Range", "")
+        resumed = response.status_code == 206
+        if resumed and not content_range.startswith(f"bytes {offset}-"):
+            raise IOError(f"unexpected Content-Range '{content_range}'")
+        if resumed:
+            digest = _file_sha256(part_path)
+            expected = content_range.rpartition("/")[2]
+        else:
+            digest = hashlib.sha256()
+            expected = response.headers.get("Content-Length")
+            # Remember the validators so an interrupted download can resume
+            manifest.set(
+                url,
+                dict(
+                    entry,
+                    partial={
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                    },
+                ),
+            )
+
+        with open(part_path, "ab" if resumed else "wb") as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                digest.update(chunk)
+
+        size = os.path.getsize(part_path)
+        if expected and expected.isdigit() and int(expected) != size:
+            raise IOError(f"incomplete download ({size} of {expected} bytes)")
+
+    sha256 = digest.hexdigest()
+    unchanged = sha256 == entry.get("sha256") and os.path.exists(filepath)
+    os.replace(part_path, filepath)
+    validators = entry.get("partial", {}) if resumed else {}
+    manifest.set(
+        url,
+        {
+            "etag": response.headers.get("ETag") or validators.get("etag"),
+            "last_modified": response.headers.get("Last-Modified")
+            or validators.get("last_modified"),
+            "size": size,
+            "sha256": sha256,
+            "path": filepath,
+        },
+    )
+    if unchanged:
+        return "unchanged"
+    return "resumed" if resumed else "downloaded"
+
+
+def download_all(urls, output_folder=OUTPUT_FOLDER, workers=DOWNLOAD_WORKERS):
+    """
+    Download every URL into output_folder. Returns a Counter of outcomes
+    ("downloaded", "resumed", "unchanged", "failed").
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    session = make_session(workers)
+    limiter = HostRateLimiter()
+    manifest = DownloadManifest(os.path.join(output_folder, MANIFEST_NAME))
+    outcomes = Counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        # Results pages often link the same filing twice
+        for url, filepath in local_paths(urls, output_folder).items():
+            future = pool.submit(
+                download_pdf, session, limiter, manifest, url, filepath
+            )
+            futures[future] = (url, filepath)
+        for future in as_completed(futures):
+            url, filepath = futures[future]
+            try:
+                outcome = future.result()
+                print(f"{outcome.capitalize()}: {url} -> {filepath}")
+            except Exception as e:
+                print(f"Failed to download {url}: {e}")
+                outcome = "failed"
+            outcomes[outcome] += 1
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Download the PDFs linked from saved BSE/NSE results pages"
+    )
+    parser.add_argument(
+        "html_path",
+        nargs="?",
+        default=HTML_FILE,
+        help="saved results page, or a directory of them",
+    )
+    parser.add_argument("--output", "-o", default=OUTPUT_FOLDER)
+    parser.add_argument("--workers", "-w", type=int, default=DOWNLOAD_WORKERS)
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="time link extraction against BeautifulSoup instead of downloading",
+    )
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_extraction(args.html_path)
+        return 0
+
+    if os.path.isdir(args.html_path):
+        urls = extract_pdf_links_from_dir(args.html_path)
+    else:
+        urls = extract_pdf_links(args.html_path)
+    if not urls:
+        return 1
+    start = time.time()
+    outcomes = download_all(urls, args.output, args.workers)
+    summary = ", ".join(f"{count} {outcome}" for outcome, count in outcomes.items())
+    print(f"{summary} in {time.time() - start:.1f}s")
+    return 1 if outcomes["failed"] else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,59 @@
+"""
+On-disk cache of text extracted from PDFs.
+
+Entries are keyed by the SHA-256 of the PDF's bytes plus an extractor
+version, so a renamed or re-downloaded but unchanged file is not parsed
+again, while changing the extractor invalidates every entry. Each entry is
+the list of page texts stored as gzip-compressed JSON.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+
+CACHE_DIR = os.environ.get(
+    "PDF_TEXT_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "pdf_text"),
+)
+READ_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PdfTextCache:
+    def __init__(self, version, directory=CACHE_DIR):
+        self.version = version
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, pdf_path):
+        raw = f"{file_sha256(pdf_path)}:{self.version}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def get(self, key):
+        """Cached page texts, or None on a miss or unreadable entry."""
+        try:
+            with gzip.open(self._path(key), "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable PDF text cache entry {key}: {e}")
+            return None
+
+    def put(self, key, pages):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(pages, f)
+        os.replace(tmp_path, path)
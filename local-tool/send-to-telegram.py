@@ -10,6 +10,12 @@ import PyPDF2
 import google.generativeai as genai
 import re
 import glob
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import tools_path
+import llm_cache
+import pdf_text_cache
 
 load_dotenv()
 
@@ -18,6 +24,21 @@ OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
+EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+# Pages handed to a worker process at a time
+PAGES_PER_TASK = 8
+# Bump when extraction changes so cached page text is re-extracted
+EXTRACTOR_VERSION = f"PyPDF2-{PyPDF2.__version__}/1"
+
+# Batch runner: Gemini calls in flight, items buffered between stages and
+# pause between PDFs sent to Telegram
+SUMMARY_CONCURRENCY = int(os.environ.get("SUMMARY_CONCURRENCY", 4))
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 8))
+SEND_INTERVAL = float(os.environ.get("TELEGRAM_SEND_INTERVAL", 1))
+PDF_FOLDER = "/Users/fakrudeen/Downloads/WhatsApp and Telegram for Indian Stock Research Reports/local-tool/pdf"
+
+_extract_pool = None
+_text_cache = None
 
 
 async def send_to_telegram(token, chat_id, summaries_dir, downloads_dir):
@@ -132,14 +153,71 @@ async def send_hello_world(token, chat_id):
         return False
 
 
-def extract_text_from_pdf(pdf_path):
-    """Extracts all text from a PDF file."""
+def _extract_page_range(pdf_path, start, stop):
+    """Text of pages [start, stop); runs in a worker process."""
+    with open(pdf_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def get_extract_pool():
+    """Process pool shared by all PDF extractions, created on first use."""
+    global _extract_pool
+    if _extract_pool is None:
+        _extract_pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+    return _extract_pool
+
+
+def iter_pdf_pages(pdf_path, pool=None):
+    """
+    Yield the text of each page in order. With a process pool, ranges of
+    PAGES_PER_TASK pages are extracted in parallel and each page is yielded
+    as soon as its range (and every earlier one) is done.
+    """
     with open(pdf_path, "rb") as f:
         reader = PyPDF2.PdfReader(f)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""
-    return text
+        page_count = len(reader.pages)
+        if pool is None:
+            for page in reader.pages:
+                yield page.extract_text() or ""
+            return
+
+    futures = [
+        pool.submit(
+            _extract_page_range,
+            pdf_path,
+            start,
+            min(start + PAGES_PER_TASK, page_count),
+        )
+        for start in range(0, page_count, PAGES_PER_TASK)
+    ]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def get_text_cache():
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = pdf_text_cache.PdfTextCache(EXTRACTOR_VERSION)
+    return _text_cache
+
+
+def extract_text_from_pdf(pdf_path, pool=None):
+    """
+    Extracts all text from a PDF file. Page text is cached by file content,
+    so an unchanged PDF is not parsed again.
+    """
+    cache = get_text_cache()
+    key = cache.key(pdf_path)
+    pages = cache.get(key)
+    if pages is None:
+        pages = list(iter_pdf_pages(pdf_path, pool))
+        cache.put(key, pages)
+    return "".join(pages)
 
 
 def summarize_text_with_openai(text, max_tokens=10000):
@@ -149,13 +227,18 @@ def summarize_text_with_openai(text, max_tokens=10000):
         "summarise the concall or investor presentation useful for investors as bullet points in markup: also include industry tailwinds or headwinds., "
         + f"{text}"
     )
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=max_tokens,
-        temperature=0.3,
-    )
-    return response.choices[0].message.content.strip()
+
+    def call():
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=0.3,
+        )
+        return response.choices[0].message.content.strip()
+
+    params = {"max_tokens": max_tokens, "temperature": 0.3}
+    return llm_cache.cached_call("openai", "gpt-4o", prompt, call, params)
 
 
 def summarize_text_with_gemini(text, max_tokens=20000):
@@ -165,24 +248,48 @@ def summarize_text_with_gemini(text, max_tokens=20000):
 
     genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-    model = genai.GenerativeModel("models/gemini-1.5-pro-002")
+    model_name = "models/gemini-1.5-pro-002"
+    model = genai.GenerativeModel(model_name)
     prompt = (
         "start with company introduction.creat crisp summary of the following concall or investor presentation as bullet points useful for investors. include industry tailwinds or headwinds. shrink to 6000 characters or less."
         "Use Newline for formatting."
         f"{text}"
     )
-    response = model.generate_content(prompt)
-    return response.text.strip()
+    return llm_cache.cached_call(
+        "gemini",
+        model_name,
+        prompt,
+        lambda: model.generate_content(prompt).text.strip(),
+    )
 
 
 def summarize_pdf(pdf_path):
-    text = extract_text_from_pdf(pdf_path)
+    text = extract_text_from_pdf(pdf_path, get_extract_pool())
     # Optionally truncate if text is very long (Gemini context limit is ~32k tokens)
 
     summary = summarize_text_with_gemini(text)
     return summary
 
 
+async def send_summary(bot, chat_id, message, file_path, file_caption=None):
+    """Send a (split) message and then the file, using an already open bot."""
+    for chunk in split_message(message):
+        await bot.send_message(
+            chat_id=chat_id,
+            text=escape_markdown(chunk),
+            parse_mode="MarkdownV2",
+        )
+        await asyncio.sleep(0.5)  # avoid rate limits
+    with open(file_path, "rb") as f:
+        await bot.send_document(
+            chat_id=chat_id,
+            document=f,
+            filename=os.path.basename(file_path),
+            caption=escape_markdown(file_caption) if file_caption else None,
+            parse_mode="MarkdownV2",
+        )
+
+
 async def send_message_and_file(
     token, chat_id, message, file_path, file_caption=None, parse_mode="Markdown"
 ):
@@ -196,24 +303,8 @@ async def send_message_and_file(
     :param parse_mode: Parse mode for the message (default: Markdown)
     """
     try:
-        bot = telegram.Bot(token=token)
-        # Send the message
-        for chunk in split_message(message):
-            await bot.send_message(
-                chat_id=chat_id,
-                text=escape_markdown(chunk),
-                parse_mode="MarkdownV2",
-            )
-            await asyncio.sleep(0.5)  # avoid rate limits
-        # Send the file
-        with open(file_path, "rb") as f:
-            await bot.send_document(
-                chat_id=chat_id,
-                document=f,
-                filename=os.path.basename(file_path),
-                caption=escape_markdown(file_caption) if file_caption else None,
-                parse_mode="MarkdownV2",
-            )
+        async with telegram.Bot(token=token) as bot:
+            await send_summary(bot, chat_id, message, file_path, file_caption)
         print(f"Sent message and file '{file_path}' successfully.")
         return True
     except Exception as e:
@@ -221,6 +312,94 @@ async def send_message_and_file(
         return False
 
 
+async def run_batch(pdf_files, token, chat_id):
+    """
+    Summarize and send a batch of PDFs as a pipeline:
+
+    - extraction: EXTRACT_WORKERS PDFs at a time, each split into page
+      ranges on the shared process pool, so a single large PDF still keeps
+      every worker busy
+    - summarization: SUMMARY_CONCURRENCY LLM calls in flight on threads
+    - sending: one long-lived bot sending results in completion order
+
+    Stages are connected by queues of at most PIPELINE_QUEUE_SIZE items, so
+    a slow stage holds back the ones before it instead of piling up text in
+    memory. Returns (sent, failed) counts.
+    """
+    loop = asyncio.get_running_loop()
+    extract_pool = get_extract_pool()
+    llm_threads = ThreadPoolExecutor(max_workers=SUMMARY_CONCURRENCY)
+    texts = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    summaries = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    pending = iter(pdf_files)
+    counts = {"sent": 0, "failed": 0}
+
+    async def extract():
+        for pdf_file in pending:
+            try:
+                # The thread only hashes, waits on the pool and caches
+                text = await loop.run_in_executor(
+                    None, extract_text_from_pdf, pdf_file, extract_pool
+                )
+            except Exception as e:
+                print(f"Error extracting text from {pdf_file}: {e}")
+                counts["failed"] += 1
+                continue
+            await texts.put((pdf_file, text))
+
+    async def summarize():
+        while (item := await texts.get()) is not None:
+            pdf_file, text = item
+            try:
+                summary = await loop.run_in_executor(
+                    llm_threads, summarize_text_with_gemini, text
+                )
+            except Exception as e:
+                print(f"Error summarizing {pdf_file}: {e}")
+                counts["failed"] += 1
+                continue
+            print(f"Summarized: {pdf_file}")
+            await summaries.put((pdf_file, summary))
+
+    async def send(bot):
+        while (item := await summaries.get()) is not None:
+            pdf_file, summary = item
+            try:
+                # Use the full filename as caption
+                await send_summary(
+                    bot, chat_id, summary, pdf_file, os.path.basename(pdf_file)
+                )
+                print(f"Sent message and file '{pdf_file}' successfully.")
+                counts["sent"] += 1
+            except Exception as e:
+                print(f"Error sending {pdf_file}: {e}")
+                counts["failed"] += 1
+            await asyncio.sleep(SEND_INTERVAL)
+
+    async def run_stage(workers, next_queue, next_workers):
+        """Run a stage's workers, then tell every next-stage worker to stop."""
+        await asyncio.gather(*workers)
+        for _ in range(next_workers):
+            await next_queue.put(None)
+
+    try:
+        async with telegram.Bot(token=token) as bot:
+            await asyncio.gather(
+                run_stage(
+                    [extract() for _ in range(EXTRACT_WORKERS)],
+                    texts,
+                    SUMMARY_CONCURRENCY,
+                ),
+                run_stage(
+                    [summarize() for _ in range(SUMMARY_CONCURRENCY)], summaries, 1
+                ),
+                send(bot),
+            )
+    finally:
+        llm_threads.shutdown(wait=False)
+    return counts["sent"], counts["failed"]
+
+
 def escape_markdown(text):
     """
     Escape special characters for Telegram MarkdownV2, excluding intentional Markdown syntax.
@@ -248,30 +427,21 @@ def split_message(text, chunk_size=3900):
 
 
 if __name__ == "__main__":
-    pdf_folder = "/Users/fakrudeen/Downloads/WhatsApp and Telegram for Indian Stock Research Reports/local-tool/pdf"
-    pdf_files = glob.glob(os.path.join(pdf_folder, "*.pdf"))
+    parser = argparse.ArgumentParser(
+        description="Summarize PDFs with Gemini and send them to Telegram"
+    )
+    parser.add_argument("pdf_folder", nargs="?", default=PDF_FOLDER)
+    args = parser.parse_args()
+    pdf_files = sorted(glob.glob(os.path.join(args.pdf_folder, "*.pdf")))
 
     if not pdf_files:
         print("No PDF files found in the folder.")
     else:
-        for pdf_file in pdf_files:
-            print(f"Processing: {pdf_file}")
-            summary = summarize_pdf(pdf_file)
-            print("Summary:\n", summary)
-            # Use the PDF filename (without extension) as caption
-            file_caption = os.path.splitext(os.path.basename(pdf_file))[0]
-            asyncio.run(
-                send_message_and_file(
-                    token=TELEGRAM_BOT_TOKEN,
-                    chat_id=TELEGRAM_CHAT_ID,
-                    message=summary,
-                    file_path=pdf_file,
-                    file_caption=pdf_file.split("/")[
-                        -1
-                    ],  # Use the full filename as caption
-                )
-            )
-            # Optional: add a delay to avoid Telegram rate limits
-            import time
-
-            time.sleep(2)
+        start = time.time()
+        sent, failed = asyncio.run(
+            run_batch(pdf_files, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+        )
+        print(
+            f"Sent {sent} of {len(pdf_files)} PDFs ({failed} failed) "
+            f"in {time.time() - start:.1f}s"
+        )
@@ -0,0 +1,15 @@
+"""
+Make the shared helpers in ../tools importable from the local-tool scripts.
+
+Import this module before importing any of them. The tools/ modules these
+scripts use must only depend on the standard library, so the scripts keep
+working without the web app's dependencies installed.
+"""
+
+import os
+import sys
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools")
+
+if TOOLS_DIR not in sys.path:
+    sys.path.append(TOOLS_DIR)
@@ -9,11 +9,15 @@ you need to use a proxy service like Webshare (https://www.webshare.io/).
 """
 
 import re
+import os
 import langdetect
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
 from youtube_transcript_api.proxies import WebshareProxyConfig, GenericProxyConfig
 import google.generativeai as genai
 
+import tools_path
+import text_utils
+
 def extract_video_id(youtube_url):
     """
     Extract the video ID from a YouTube URL.
@@ -67,19 +71,8 @@ def clean_transcript(transcript_text):
     Returns:
         str: The cleaned transcript text
     """
-    # Remove HTML tags if any
-    transcript_text = re.sub(r'<[^>]+>', '', transcript_text)
-    
-    # Remove multiple spaces
-    transcript_text = re.sub(r'\s+', ' ', transcript_text)
-    
-    # Remove special characters that might interfere with summarization
-    transcript_text = re.sub(r'[\r\n\t]', ' ', transcript_text)
-    
-    # Trim leading and trailing whitespace
-    transcript_text = transcript_text.strip()
-    
-    return transcript_text
+    # Tags, entities and whitespace are handled by the shared helper
+    return text_utils.clean_text(transcript_text)
 
 def get_transcript(video_id, language='en', proxy_username=None, proxy_password=None, proxy_host=None, proxy_port=None):
     """
@@ -24,6 +24,10 @@ from youtube_transcript_api import (
 from youtube_transcript_api.proxies import WebshareProxyConfig, GenericProxyConfig
 import google.generativeai as genai
 
+import tools_path
+import llm_cache
+import text_utils
+
 
 def extract_video_id(youtube_url):
     """
@@ -80,19 +84,8 @@ def clean_transcript(transcript_text):
     Returns:
         str: The cleaned transcript text
     """
-    # Remove HTML tags if any
-    transcript_text = re.sub(r"<[^>]+>", "", transcript_text)
-
-    # Remove multiple spaces
-    transcript_text = re.sub(r"\s+", " ", transcript_text)
-
-    # Remove special characters that might interfere with summarization
-    transcript_text = re.sub(r"[\r\n\t]", " ", transcript_text)
-
-    # Trim leading and trailing whitespace
-    transcript_text = transcript_text.strip()
-
-    return transcript_text
+    # Tags, entities and whitespace are handled by the shared helper
+    return text_utils.clean_text(transcript_text)
 
 
 def get_transcript(
@@ -318,6 +311,24 @@ def configure_gemini(api_key):
         return False
 
 
+def generate_content_cached(model, model_name, prompt):
+    """
+    Generate text with Gemini, reusing the stored response when the same prompt
+    was already sent to the same model.
+
+    Args:
+        model (GenerativeModel): The initialized Gemini model
+        model_name (str): The Gemini model name, part of the cache key
+        prompt (str): The prompt to send
+
+    Returns:
+        str: The generated text
+    """
+    return llm_cache.cached_call(
+        "gemini", model_name, prompt, lambda: model.generate_content(prompt).text
+    )
+
+
 def generate_summary(transcript_text, api_key, model_name="gemini-1.5-pro"):
     """
     Generate a detailed summary of the transcript using Gemini.
@@ -362,8 +373,7 @@ def generate_summary(transcript_text, api_key, model_name="gemini-1.5-pro"):
             Please provide a detailed summary that would help someone understand the full content without watching the video.
             """
 
-            response = model.generate_content(prompt)
-            return response.text
+            return generate_content_cached(model, model_name, prompt)
         else:
             # For multiple chunks, process each chunk and then combine
             print(f"Transcript is large, processing in {len(chunks)} chunks...")
@@ -386,8 +396,9 @@ def generate_summary(transcript_text, api_key, model_name="gemini-1.5-pro"):
                 """
 
                 try:
-                    chunk_response = model.generate_content(chunk_prompt)
-                    chunk_summaries.append(chunk_response.text)
+                    chunk_summaries.append(
+                        generate_content_cached(model, model_name, chunk_prompt)
+                    )
                 except Exception as e:
                     print(f"Error generating summary for chunk {i+1}: {e}")
                     chunk_summaries.append(f"[Error summarizing part {i+1}]")
@@ -407,8 +418,7 @@ def generate_summary(transcript_text, api_key, model_name="gemini-1.5-pro"):
             5. Include sections or headings if appropriate
             """
 
-            final_response = model.generate_content(combined_prompt)
-            return final_response.text
+            return generate_content_cached(model, model_name, combined_prompt)
 
     except Exception as e:
         print(f"Error generating summary: {e}")
@@ -6,99 +6,114 @@ import matplotlib.pyplot as plt
 from flask import Blueprint, Flask, render_template, request, jsonify
 import yfinance as yf
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import io
 import base64
-import openai
 import os
 from dotenv import load_dotenv
 
+import llm_client
+
+from . import fund_index, price_store, symbol_cache
+from .chart_cache import ChartCache
+
 funds_bp = Blueprint("funds", __name__, template_folder="templates")
 
 load_dotenv()
 
-openai.api_key = os.environ.get("OPENAI_API_KEY")
+MAX_COMPARE_SYMBOLS = 50
+TRADING_DAYS_PER_YEAR = 252
+CHART_COLORS = ["#2E86AB", "#A23B72"]
+CHART_FORMATS = ("series", "png")
+CHART_RENDER_OPTIONS = {"figsize": (12, 8), "dpi": 300}
+MAX_SEARCH_RESULTS = 20
+
+chart_cache = ChartCache(
+    max_entries=int(os.environ.get("CHART_CACHE_SIZE", 64)),
+    directory=os.environ.get("CHART_CACHE_DIR"),
+)
+
+
+def render_comparison_chart(normalized, duration, options=CHART_RENDER_OPTIONS):
+    """Render normalized performance series ({symbol: Series}) to PNG bytes."""
+    plt.figure(figsize=options["figsize"])
+    for (symbol, values), color in zip(normalized.items(), CHART_COLORS):
+        plt.plot(values.index, values.values, linewidth=3, label=symbol, color=color)
+
+    plt.title(f"Fund Performance Comparison ({duration.upper()})", fontsize=16, pad=20)
+    plt.xlabel("Date", fontsize=12)
+    plt.ylabel("Performance (%)", fontsize=12)
+    plt.legend()
+    plt.grid(True, alpha=0.3)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+
+    img_buffer = io.BytesIO()
+    plt.savefig(img_buffer, format="png", dpi=options["dpi"], bbox_inches="tight")
+    plt.close()
+    return img_buffer.getvalue()
 
 
-def compare_mutual_funds(fund1_symbol, fund2_symbol, duration="3mo"):
+def comparison_chart_url(normalized, duration, options=CHART_RENDER_OPTIONS):
+    """
+    Return the comparison chart as a base64 data URL, rendering it only if
+    this symbol set, duration, render options and data version isn't cached.
+    """
+    last_values = [
+        (values.index[-1].date().isoformat(), round(float(values.iloc[-1]), 6))
+        for values in normalized.values()
+    ]
+    key = chart_cache.make_key(list(normalized), duration, options, last_values)
+    png = chart_cache.get(key)
+    if png is None:
+        png = render_comparison_chart(normalized, duration, options)
+        chart_cache.put(key, png)
+    return f"data:image/png;base64,{base64.b64encode(png).decode()}"
+
+
+def chart_series(normalized):
+    """
+    Compact chart payload for drawing in the browser: one shared list of ISO
+    dates and, per symbol, values rounded to 2 decimals (null where a fund has
+    no price on that date).
+    """
+    aligned = pd.DataFrame(normalized).sort_index().round(2)
+    return {
+        "dates": [d.strftime("%Y-%m-%d") for d in aligned.index],
+        "values": {
+            symbol: [None if pd.isna(v) else v for v in aligned[symbol].tolist()]
+            for symbol in aligned.columns
+        },
+    }
+
+
+def compare_mutual_funds(fund1_symbol, fund2_symbol, duration="3mo", chart="series"):
+    """
+    Compare two funds over `duration`. `chart` selects how the performance
+    chart is returned: "series" (date/value arrays drawn client-side) or "png"
+    (server-rendered image, for export).
+    """
     try:
-        # Fetch data using the duration parameter directly
-        fund1 = yf.download(fund1_symbol, period=duration, progress=False)
-        fund2 = yf.download(fund2_symbol, period=duration, progress=False)
+        # Read from the local price store; only missing history hits the network
+        histories = price_store.get_histories([fund1_symbol, fund2_symbol], duration)
+        fund1_prices = histories[fund1_symbol]
+        fund2_prices = histories[fund2_symbol]
 
         error_symbols = []
-        if fund1.empty:
+        if fund1_prices.empty:
             error_symbols.append(fund1_symbol)
-        if fund2.empty:
+        if fund2_prices.empty:
             error_symbols.append(fund2_symbol)
         if error_symbols:
             raise ValueError(f"Unable to fetch data for: {', '.join(error_symbols)}")
-        if fund1.empty or fund2.empty:
-            raise ValueError("Unable to fetch data for one or both fund symbols")
-
-        # Handle column structure
-        if hasattr(fund1.columns, "levels") and len(fund1.columns.levels) > 1:
-            fund1.columns = [
-                col[0] if isinstance(col, tuple) else col for col in fund1.columns
-            ]
-        if hasattr(fund2.columns, "levels") and len(fund2.columns.levels) > 1:
-            fund2.columns = [
-                col[0] if isinstance(col, tuple) else col for col in fund2.columns
-            ]
-
-        # Get prices
-        price_columns = ["Close"]
-        fund1_prices = None
-        fund2_prices = None
-
-        for col in price_columns:
-            if col in fund1.columns:
-                fund1_prices = fund1[col]
-                break
-        for col in price_columns:
-            if col in fund2.columns:
-                fund2_prices = fund2[col]
-                break
 
         # Calculate performance
         fund1_normalized = ((fund1_prices / fund1_prices.iloc[0]) - 1) * 100
         fund2_normalized = ((fund2_prices / fund2_prices.iloc[0]) - 1) * 100
+        normalized = {fund1_symbol: fund1_normalized, fund2_symbol: fund2_normalized}
 
-        # Generate chart
-        plt.figure(figsize=(12, 8))
-        plt.plot(
-            fund1_normalized.index,
-            fund1_normalized.values,
-            linewidth=3,
-            label=fund1_symbol,
-            color="#2E86AB",
-        )
-        plt.plot(
-            fund2_normalized.index,
-            fund2_normalized.values,
-            linewidth=3,
-            label=fund2_symbol,
-            color="#A23B72",
-        )
-
-        plt.title(
-            f"Fund Performance Comparison ({duration.upper()})", fontsize=16, pad=20
-        )
-        plt.xlabel("Date", fontsize=12)
-        plt.ylabel("Performance (%)", fontsize=12)
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-
-        # Convert to base64
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format="png", dpi=300, bbox_inches="tight")
-        img_buffer.seek(0)
-        chart_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-        plt.close()
-
-        return {
+        result = {
             "fund1_symbol": fund1_symbol,
             "fund2_symbol": fund2_symbol,
             "fund1_return": fund1_normalized.iloc[-1],
@@ -108,7 +123,93 @@ def compare_mutual_funds(fund1_symbol, fund2_symbol, duration="3mo"):
                 if fund1_normalized.iloc[-1] > fund2_normalized.iloc[-1]
                 else fund2_symbol
             ),
-            "chart_data": f"data:image/png;base64,{chart_base64}",
+        }
+        if chart == "png":
+            result["chart_data"] = comparison_chart_url(normalized, duration)
+        else:
+            result["series"] = chart_series(normalized)
+        return result
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _nan_to_none(values):
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def compare_many_funds(symbols, duration="3mo"):
+    """
+    Compare any number of funds over `duration`. All price histories are
+    aligned into one wide frame and every metric is computed column-wise in a
+    single NumPy pass.
+    """
+    try:
+        symbols = list(dict.fromkeys(symbols))
+        histories = price_store.get_histories(symbols, duration)
+
+        error_symbols = [s for s in symbols if histories[s].empty]
+        if error_symbols:
+            raise ValueError(f"Unable to fetch data for: {', '.join(error_symbols)}")
+
+        # Common date index: carry the last NAV over holidays of individual
+        # funds and start where every fund has a price
+        raw = pd.DataFrame(histories)[symbols].sort_index()
+        wide = raw.ffill().dropna()
+        if len(wide) < 2:
+            raise ValueError("Not enough overlapping price history to compare")
+
+        prices = wide.to_numpy()
+        growth = prices / prices[0]
+        normalized = (growth - 1) * 100
+        total_return = normalized[-1]
+
+        years = (wide.index[-1] - wide.index[0]).days / 365.25
+        if years >= 1:
+            cagr = (growth[-1] ** (1 / years) - 1) * 100
+        else:
+            # Annualizing a window shorter than a year only exaggerates it
+            cagr = np.full(len(symbols), np.nan)
+        # Returns between a fund's own prices: a day carried over a holiday
+        # is not a zero-return day, the move shows up on its next price
+        daily_returns = prices[1:] / prices[:-1] - 1
+        traded = raw.reindex(wide.index).notna().to_numpy()[1:]
+        daily_returns[~traded] = np.nan
+        volatility = (
+            np.nanstd(daily_returns, axis=0, ddof=1)
+            * np.sqrt(TRADING_DAYS_PER_YEAR)
+            * 100
+        )
+        max_drawdown = (prices / np.maximum.accumulate(prices, axis=0) - 1).min(
+            axis=0
+        ) * 100
+
+        order = np.argsort(-total_return, kind="stable")
+        rank = np.empty(len(symbols), dtype=int)
+        rank[order] = np.arange(1, len(symbols) + 1)
+
+        cagr = _nan_to_none(cagr)
+        total_return = _nan_to_none(total_return)
+        volatility = _nan_to_none(volatility)
+        max_drawdown = _nan_to_none(max_drawdown)
+
+        funds = [
+            {
+                "symbol": symbols[i],
+                "rank": int(rank[i]),
+                "return": total_return[i],
+                "cagr": cagr[i],
+                "volatility": volatility[i],
+                "max_drawdown": max_drawdown[i],
+            }
+            for i in order
+        ]
+        return {
+            "duration": duration,
+            "start_date": wide.index[0].date().isoformat(),
+            "end_date": wide.index[-1].date().isoformat(),
+            "winner": funds[0]["symbol"],
+            "funds": funds,
         }
 
     except Exception as e:
@@ -123,10 +224,39 @@ def index():
 @funds_bp.route("/compare", methods=["POST"])
 def compare():
     data = request.json
-    result = compare_mutual_funds(data["fund1"], data["fund2"], data["duration"])
+    chart = request.args.get("format", "series")
+    if chart not in CHART_FORMATS:
+        return jsonify({"error": f"Unsupported format: {chart}"}), 400
+
+    result = compare_mutual_funds(
+        data["fund1"], data["fund2"], data["duration"], chart=chart
+    )
     return jsonify(result)
 
 
+@funds_bp.route("/compare_many", methods=["POST"])
+def compare_many():
+    data = request.json
+    symbols = [s.strip() for s in data.get("funds", []) if s and s.strip()]
+    if not symbols:
+        return jsonify({"error": "No fund symbols provided"}), 400
+    if len(symbols) > MAX_COMPARE_SYMBOLS:
+        return (
+            jsonify({"error": f"At most {MAX_COMPARE_SYMBOLS} funds can be compared"}),
+            400,
+        )
+
+    result = compare_many_funds(symbols, data.get("duration", "3mo"))
+    return jsonify(result)
+
+
+@funds_bp.route("/search")
+def search():
+    query = request.args.get("q", "")
+    limit = min(request.args.get("limit", 10, type=int), MAX_SEARCH_RESULTS)
+    return jsonify({"results": fund_index.get_index().search(query, limit=limit)})
+
+
 @funds_bp.route("/resolve_symbol", methods=["POST"])
 def resolve_symbol():
     data = request.json
@@ -134,6 +264,15 @@ def resolve_symbol():
     if not fund_name:
         return jsonify({"error": "No fund name provided"}), 400
 
+    # Local catalogue first, then previous LLM answers, then the LLM itself
+    symbol = fund_index.get_index().resolve(fund_name)
+    if symbol:
+        return jsonify({"symbol": symbol})
+
+    found, symbol = symbol_cache.lookup(fund_name)
+    if found:
+        return jsonify({"symbol": symbol})
+
     prompt = (
         f"Given the mutual fund name '{fund_name}', "
         "what is the most likely Yahoo Finance symbol for this Indian mutual fund? "
@@ -143,14 +282,11 @@ def resolve_symbol():
     )
 
     try:
-        client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=20,
-            temperature=0,
+        reply = llm_client.chat(
+            prompt, model="gpt-3.5-turbo", max_tokens=20, temperature=0
         )
-        symbol = response.choices[0].message.content.strip().split()[0]
+        symbol = reply.split()[0]
+        symbol_cache.store(fund_name, symbol)
         return jsonify({"symbol": symbol})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,102 @@
+"""
+Size-bounded LRU cache for rendered comparison charts.
+
+Entries live in memory and, when a directory is configured, are also written
+to disk as PNG files so they survive restarts and are shared between gunicorn
+workers. Keys include the data version, so a chart is re-rendered only after
+new prices arrive.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+class ChartCache:
+    def __init__(self, max_entries=64, directory=None, max_disk_entries=512):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(symbols, duration, options, data_version):
+        """Stable key for a chart of `symbols` (order matters for colours)."""
+        raw = json.dumps(
+            [
+                [s.strip().upper() for s in symbols],
+                duration,
+                sorted(options.items()),
+                data_version,
+            ],
+            default=str,
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        """Return the cached PNG bytes for `key`, or None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                png = f.read()
+            os.utime(self._path(key))  # mtime doubles as last-used time
+        except OSError:
+            return None
+        self._remember(key, png)
+        return png
+
+    def put(self, key, png):
+        self._remember(key, png)
+        if not self.directory:
+            return
+        try:
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(png)
+            os.replace(tmp_path, self._path(key))
+            self._evict_disk()
+        except OSError as e:
+            print(f"Error writing chart cache: {e}")
+
+    def _remember(self, key, png):
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _evict_disk(self):
+        files = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".png")
+        ]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=_mtime)
+        for path in files[: len(files) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,123 @@
+"""
+In-memory search index over a local catalogue of mutual fund names and Yahoo
+Finance symbols, used for /funds/search typeahead and as the first step of
+symbol resolution before falling back to the LLM.
+
+The catalogue is a CSV (columns: name, symbol) or a JSON list of
+{"name": ..., "symbol": ...} objects, read from FUND_CATALOGUE_PATH.
+"""
+
+import csv
+import heapq
+import json
+import os
+import threading
+from collections import defaultdict
+
+from .names import RESOLVE_CUTOFF, TrigramMatcher, normalize
+
+CATALOGUE_PATH = os.environ.get(
+    "FUND_CATALOGUE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fund_catalogue.csv"),
+)
+# Only index token prefixes up to this length; longer query tokens are cut
+MAX_PREFIX = 12
+# Minimum trigram similarity for fuzzy search suggestions
+FUZZY_CUTOFF = 0.3
+
+
+class FundIndex:
+    def __init__(self, funds):
+        self.funds = []
+        self._keys = []
+        self._by_name = {}
+        self._by_symbol = {}
+        self._prefixes = defaultdict(set)
+        self._matcher = TrigramMatcher()
+
+        for name, symbol in funds:
+            key = normalize(name)
+            if not key or not symbol or key in self._by_name:
+                continue
+            fund_id = len(self.funds)
+            self.funds.append({"name": name, "symbol": symbol})
+            self._keys.append(key)
+            self._by_name[key] = fund_id
+            self._by_symbol[symbol.upper()] = fund_id
+            for token in key.split():
+                for i in range(1, min(len(token), MAX_PREFIX) + 1):
+                    self._prefixes[token[:i]].add(fund_id)
+            self._matcher.add(fund_id, key)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            print(f"Fund catalogue not found at {path}")
+            return cls([])
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                rows = json.load(f)
+            else:
+                rows = list(csv.DictReader(f))
+        return cls(
+            (row.get("name", "").strip(), row.get("symbol", "").strip()) for row in rows
+        )
+
+    def _prefix_matches(self, tokens):
+        sets = [self._prefixes.get(token[:MAX_PREFIX], set()) for token in tokens]
+        if not sets:
+            return set()
+        return set.intersection(*sorted(sets, key=len))
+
+    def search(self, query, limit=10):
+        """
+        Funds whose name tokens start with every query token, best first;
+        falls back to trigram similarity when that finds too few.
+        """
+        key = normalize(query)
+        if not key:
+            return []
+
+        ranked = []
+        exact_symbol = self._by_symbol.get(query.strip().upper())
+        if exact_symbol is not None:
+            ranked.append(exact_symbol)
+
+        prefix_ids = self._prefix_matches(key.split())
+        ranked += heapq.nsmallest(
+            limit,
+            prefix_ids,
+            key=lambda i: (not self._keys[i].startswith(key), len(self._keys[i]), i),
+        )
+        if len(prefix_ids) < limit:
+            fuzzy = self._matcher.scores(key, FUZZY_CUTOFF)
+            ranked += heapq.nlargest(limit, fuzzy, key=fuzzy.get)
+
+        results = []
+        for fund_id in dict.fromkeys(ranked):
+            results.append(self.funds[fund_id])
+            if len(results) == limit:
+                break
+        return results
+
+    def resolve(self, fund_name):
+        """Return the symbol for an exact or near-exact name match, else None."""
+        key = normalize(fund_name)
+        if key in self._by_name:
+            return self.funds[self._by_name[key]]["symbol"]
+        if fund_name.strip().upper() in self._by_symbol:
+            return fund_name.strip().upper()
+        best = self._matcher.best(key, RESOLVE_CUTOFF)
+        return self.funds[best]["symbol"] if best is not None else None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FundIndex.load(CATALOGUE_PATH)
+        return _index
@@ -0,0 +1,87 @@
+"""
+Fund name normalization and fuzzy matching shared by the fund catalogue
+search and the resolved-symbol cache.
+
+Names are compared on their lowercase alphanumeric tokens, and fuzzy
+matches are scored by the Jaccard similarity of character trigrams, looked
+up through an inverted index so a query only touches names sharing a
+trigram with it. A name only resolves to another one with the same plan
+(direct/regular) and option (growth/IDCW/bonus) tokens: those are different
+funds with different NAVs, however similar the rest of the name is.
+"""
+
+import re
+from collections import defaultdict
+
+# Minimum similarity for a fuzzy match to count as the same fund
+RESOLVE_CUTOFF = 0.75
+# Plan and option tokens, with "dividend" being the old name for IDCW
+VARIANT_TOKENS = {
+    "direct": "direct",
+    "regular": "regular",
+    "growth": "growth",
+    "idcw": "idcw",
+    "dividend": "idcw",
+    "bonus": "bonus",
+}
+
+
+def normalize(text):
+    return " ".join(re.findall(r"[a-z0-9]+", text.casefold()))
+
+
+def variant(key):
+    """The plan and option tokens of a normalized name."""
+    return frozenset(VARIANT_TOKENS[t] for t in key.split() if t in VARIANT_TOKENS)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramMatcher:
+    """Fuzzy lookup of items by their normalized name."""
+
+    def __init__(self):
+        self._grams = defaultdict(list)
+        self._sizes = {}
+        self._variants = {}
+
+    def __contains__(self, item):
+        return item in self._sizes
+
+    def add(self, item, key):
+        if item in self._sizes:
+            return
+        grams = trigrams(key)
+        self._sizes[item] = len(grams)
+        self._variants[item] = variant(key)
+        for gram in grams:
+            self._grams[gram].append(item)
+
+    def scores(self, key, cutoff):
+        """{item: similarity} of the items scoring at least `cutoff` against key."""
+        query_grams = trigrams(key)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for item in self._grams.get(gram, ()):
+                shared[item] += 1
+        scores = {
+            item: count / (len(query_grams) + self._sizes[item] - count)
+            for item, count in shared.items()
+        }
+        return {item: score for item, score in scores.items() if score >= cutoff}
+
+    def best(self, key, cutoff=RESOLVE_CUTOFF):
+        """
+        The most similar item scoring at least `cutoff` with the same plan and
+        option tokens as key, or None.
+        """
+        wanted = variant(key)
+        scores = {
+            item: score
+            for item, score in self.scores(key, cutoff).items()
+            if self._variants[item] == wanted
+        }
+        return max(scores, key=scores.get) if scores else None
@@ -0,0 +1,221 @@
+"""
+Local on-disk store of daily Close prices per fund symbol.
+
+History lives in a SQLite file so every gunicorn worker shares one copy. A
+symbol is downloaded from Yahoo Finance once; after that only the tail since
+the last stored date is fetched (at most every PRICE_REFRESH_INTERVAL seconds),
+so most comparisons are served without touching the network.
+"""
+
+import os
+import time
+from contextlib import closing
+from datetime import date, timedelta
+
+import pandas as pd
+import yfinance as yf
+
+from sqlite_store import Database, data_path
+
+STORE_PATH = data_path("PRICE_STORE_PATH", "prices.sqlite3")
+REFRESH_INTERVAL = int(os.environ.get("PRICE_REFRESH_INTERVAL", 6 * 60 * 60))
+
+# Same period names yfinance accepts for `period=`. Like yfinance, "1d" and
+# "5d" count trading days, not calendar days
+TRADING_DAY_PERIODS = {"1d": 1, "5d": 5}
+PERIOD_OFFSETS = {
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+EARLIEST_DATE = date(1970, 1, 2)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    close REAL NOT NULL,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    symbol TEXT PRIMARY KEY,
+    start TEXT NOT NULL,
+    checked_at REAL NOT NULL
+);
+"""
+
+_db = Database(STORE_PATH, SCHEMA)
+
+
+def _connect():
+    return _db.connect()
+
+
+def period_start(duration, today=None):
+    """
+    Return the first calendar date to load for a yfinance-style period. For
+    trading-day periods this is an upper bound on how far back they reach.
+    """
+    today = today or date.today()
+    if duration == "max":
+        return EARLIEST_DATE
+    if duration == "ytd":
+        return date(today.year, 1, 1)
+    if duration in TRADING_DAY_PERIODS:
+        # Enough calendar days to span weekends and market holidays; the
+        # result is trimmed to the last N trading days in get_histories
+        return today - timedelta(days=TRADING_DAY_PERIODS[duration] * 2 + 7)
+    if duration not in PERIOD_OFFSETS:
+        raise ValueError(f"Unsupported duration: {duration}")
+    return (pd.Timestamp(today) - PERIOD_OFFSETS[duration]).date()
+
+
+def _download(symbols, start, end=None):
+    """
+    Download daily Close prices in [start, end) for all `symbols` in one
+    batched, threaded yfinance call. Returns {symbol: Series} for the symbols
+    that came back with data.
+    """
+    if not symbols:
+        return {}
+    data = yf.download(
+        list(symbols),
+        start=start.isoformat(),
+        end=end.isoformat() if end else None,
+        threads=True,
+        progress=False,
+    )
+    if data is None or data.empty:
+        return {}
+
+    # Columns are (Price, Ticker); keep the Close level and split per ticker
+    if isinstance(data.columns, pd.MultiIndex):
+        if "Close" not in data.columns.get_level_values(0):
+            return {}
+        closes = data.xs("Close", axis=1, level=0)
+    elif "Close" in data.columns and len(symbols) == 1:
+        closes = data[["Close"]].set_axis(list(symbols), axis=1)
+    else:
+        return {}
+
+    result = {}
+    for symbol in symbols:
+        if symbol in closes.columns:
+            prices = closes[symbol].dropna()
+            if not prices.empty:
+                result[symbol] = prices
+    return result
+
+
+def _save(conn, symbol, prices):
+    conn.executemany(
+        "INSERT OR REPLACE INTO prices (symbol, date, close) VALUES (?, ?, ?)",
+        [(symbol, ts.date().isoformat(), float(close)) for ts, close in prices.items()],
+    )
+
+
+def _refresh(conn, symbols, start):
+    """
+    Make sure every symbol is stored from `start` up to the latest close.
+    Symbols needing the same kind of fetch share one batched download.
+    """
+    placeholders = ", ".join("?" * len(symbols))
+    coverage = {
+        symbol: (date.fromisoformat(covered_from), checked_at)
+        for symbol, covered_from, checked_at in conn.execute(
+            f"SELECT symbol, start, checked_at FROM coverage WHERE symbol IN ({placeholders})",
+            symbols,
+        )
+    }
+    last_dates = dict(
+        conn.execute(
+            f"SELECT symbol, MAX(date) FROM prices WHERE symbol IN ({placeholders}) GROUP BY symbol",
+            symbols,
+        )
+    )
+
+    missing = [s for s in symbols if s not in coverage]
+    backfill = [s for s in coverage if start < coverage[s][0]]
+    stale = [s for s in coverage if time.time() - coverage[s][1] >= REFRESH_INTERVAL]
+
+    if missing:
+        downloaded = _download(missing, start)
+        now = time.time()
+        with conn:
+            # Don't remember misses; the symbol may be mistyped or not listed yet
+            for symbol, prices in downloaded.items():
+                _save(conn, symbol, prices)
+                conn.execute(
+                    "INSERT OR REPLACE INTO coverage (symbol, start, checked_at) VALUES (?, ?, ?)",
+                    (symbol, start.isoformat(), now),
+                )
+
+    if backfill:
+        covered_from = max(coverage[s][0] for s in backfill)
+        downloaded = _download(backfill, start, covered_from)
+        with conn:
+            for symbol in backfill:
+                if symbol in downloaded:
+                    _save(conn, symbol, downloaded[symbol])
+                conn.execute(
+                    "UPDATE coverage SET start = ? WHERE symbol = ?",
+                    (start.isoformat(), symbol),
+                )
+
+    if stale:
+        # Re-fetch the last stored day too, its close may have been provisional
+        tail_start = min(
+            date.fromisoformat(last_dates[s]) if s in last_dates else coverage[s][0]
+            for s in stale
+        )
+        downloaded = _download(stale, tail_start)
+        now = time.time()
+        with conn:
+            for symbol in stale:
+                if symbol in downloaded:
+                    _save(conn, symbol, downloaded[symbol])
+                conn.execute(
+                    "UPDATE coverage SET checked_at = ? WHERE symbol = ?",
+                    (now, symbol),
+                )
+
+
+def get_histories(symbols, duration="3mo"):
+    """
+    Return {symbol: Series of daily Close prices over `duration`} for each
+    requested symbol. A Series is empty if Yahoo Finance has no data for it.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    start = period_start(duration)
+    with closing(_connect()) as conn:
+        _refresh(conn, symbols, start)
+        placeholders = ", ".join("?" * len(symbols))
+        rows = conn.execute(
+            f"SELECT symbol, date, close FROM prices "
+            f"WHERE symbol IN ({placeholders}) AND date >= ? ORDER BY symbol, date",
+            [*symbols, start.isoformat()],
+        ).fetchall()
+
+    grouped = {symbol: ([], []) for symbol in symbols}
+    for symbol, day, close in rows:
+        grouped[symbol][0].append(day)
+        grouped[symbol][1].append(close)
+    trading_days = TRADING_DAY_PERIODS.get(duration)
+    if trading_days:
+        grouped = {
+            symbol: (days[-trading_days:], closes[-trading_days:])
+            for symbol, (days, closes) in grouped.items()
+        }
+    return {
+        symbol: pd.Series(closes, index=pd.to_datetime(days), name=symbol, dtype=float)
+        for symbol, (days, closes) in grouped.items()
+    }
+
+
+def get_history(symbol, duration="3mo"):
+    """Return the daily Close prices of a single symbol over `duration`."""
+    return get_histories([symbol], duration)[symbol]
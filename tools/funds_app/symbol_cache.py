@@ -0,0 +1,107 @@
+"""
+Persistent fund name -> Yahoo Finance symbol cache for /funds/resolve_symbol.
+
+Names are normalized with names.normalize before lookup. Resolved symbols are
+kept for SYMBOL_CACHE_TTL seconds and 'N/A' answers for SYMBOL_CACHE_NEGATIVE_TTL
+seconds. Names that don't match exactly are compared against previously
+resolved names with the same trigram matcher as the fund catalogue, so
+near-duplicates ("Parag Parikh Flexi Cap Fund" vs "parag parikh flexicap
+fund") still hit the cache, while another plan or option of the same scheme
+(Direct Growth vs Direct IDCW) does not.
+"""
+
+import os
+import threading
+import time
+from contextlib import closing
+
+from sqlite_store import Database, data_path
+
+from .names import RESOLVE_CUTOFF, TrigramMatcher, normalize
+
+CACHE_PATH = data_path("SYMBOL_CACHE_PATH", "symbols.sqlite3")
+TTL = int(os.environ.get("SYMBOL_CACHE_TTL", 30 * 24 * 60 * 60))
+NEGATIVE_TTL = int(os.environ.get("SYMBOL_CACHE_NEGATIVE_TTL", 24 * 60 * 60))
+FUZZY_CUTOFF = float(os.environ.get("SYMBOL_CACHE_FUZZY_CUTOFF", RESOLVE_CUTOFF))
+# How often a worker reloads names resolved by other workers into its index
+INDEX_RELOAD_INTERVAL = 60
+
+NOT_FOUND = "N/A"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resolutions (
+    name_key TEXT PRIMARY KEY,
+    fund_name TEXT NOT NULL,
+    symbol TEXT,
+    resolved_at REAL NOT NULL
+);
+"""
+
+_db = Database(CACHE_PATH, SCHEMA)
+_index = {"matcher": TrigramMatcher(), "loaded_at": 0.0}
+_index_lock = threading.Lock()
+
+
+def _connect():
+    return _db.connect()
+
+
+def _is_fresh(symbol, resolved_at):
+    ttl = TTL if symbol is not None else NEGATIVE_TTL
+    return time.time() - resolved_at < ttl
+
+
+def _fuzzy_matcher(conn):
+    """Matcher over names with a resolved (non-N/A) symbol, reloaded every so often."""
+    with _index_lock:
+        if time.time() - _index["loaded_at"] >= INDEX_RELOAD_INTERVAL:
+            matcher = TrigramMatcher()
+            for (name_key,) in conn.execute(
+                "SELECT name_key FROM resolutions WHERE symbol IS NOT NULL"
+            ):
+                matcher.add(name_key, name_key)
+            _index["matcher"] = matcher
+            _index["loaded_at"] = time.time()
+        return _index["matcher"]
+
+
+def lookup(fund_name):
+    """
+    Return (True, symbol) on a cache hit, where symbol may be 'N/A' for a
+    remembered miss, or (False, None) if the name has to be resolved.
+    """
+    key = normalize(fund_name)
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT symbol, resolved_at FROM resolutions WHERE name_key = ?", (key,)
+        ).fetchone()
+        if row and _is_fresh(*row):
+            return True, row[0] or NOT_FOUND
+
+        match = _fuzzy_matcher(conn).best(key, FUZZY_CUTOFF)
+        if match is not None:
+            row = conn.execute(
+                "SELECT symbol, resolved_at FROM resolutions WHERE name_key = ?",
+                (match,),
+            ).fetchone()
+            if row and row[0] and _is_fresh(*row):
+                return True, row[0]
+
+    return False, None
+
+
+def store(fund_name, symbol):
+    """Remember the resolution of `fund_name`; 'N/A' is cached as a miss."""
+    key = normalize(fund_name)
+    if symbol.upper() == NOT_FOUND:
+        symbol = None
+    with closing(_connect()) as conn:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO resolutions (name_key, fund_name, symbol, resolved_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, fund_name, symbol, time.time()),
+            )
+    if symbol is not None:
+        with _index_lock:
+            _index["matcher"].add(key, key)
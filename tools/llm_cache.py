@@ -0,0 +1,173 @@
+"""
+On-disk cache of LLM responses shared by the Flask apps and the local-tool
+scripts.
+
+Responses are keyed by (provider, model, SHA-256 of the prompt, call params),
+so re-running the same prompt returns the stored answer instead of calling the
+provider again. Entries expire after LLM_CACHE_TTL seconds and the least
+recently used ones are evicted once the cache exceeds LLM_CACHE_MAX_MB.
+Set LLM_CACHE_DISABLED=1 to always call the provider.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from sqlite_store import Database, data_path
+
+CACHE_PATH = data_path("LLM_CACHE_PATH", "llm_cache.sqlite3")
+TTL = int(os.environ.get("LLM_CACHE_TTL", 30 * 24 * 60 * 60))
+MAX_BYTES = int(float(os.environ.get("LLM_CACHE_MAX_MB", 200)) * 1024 * 1024)
+DISABLED = os.environ.get("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_used ON responses (used_at);
+"""
+
+
+def make_key(provider, model, prompt, params=None):
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    raw = json.dumps(
+        [provider, model, prompt_hash, params or {}], sort_keys=True, default=str
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path=CACHE_PATH, ttl=TTL, max_bytes=MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.db = Database(path, SCHEMA)
+        self.db.ensure_schema()
+
+    def _connect(self):
+        return self.db.connect()
+
+    def get(self, provider, model, prompt, params=None):
+        """Return the cached response, or None on a miss or expired entry."""
+        key = make_key(provider, model, prompt, params)
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[1] >= self.ttl:
+                with conn:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            with conn:
+                conn.execute(
+                    "UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key)
+                )
+        return row[0]
+
+    def set(self, provider, model, prompt, response, params=None):
+        key = make_key(provider, model, prompt, params)
+        now = time.time()
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses "
+                    "(key, provider, model, response, size, created_at, used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, provider, model, response, len(response), now, now),
+                )
+                self._evict(conn)
+
+    def _evict(self, conn):
+        conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+        )
+        row = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        total = row[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY used_at"
+        ).fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def get_or_call(self, provider, model, prompt, call, params=None):
+        """
+        Return the cached response for this prompt, or run `call()` and cache
+        its (string) result. Empty results are not cached.
+        """
+        if DISABLED:
+            return call()
+        try:
+            cached = self.get(provider, model, prompt, params)
+        except sqlite3.Error as e:
+            print(f"Error reading LLM cache: {e}")
+            cached = None
+        if cached is not None:
+            return cached
+
+        response = call()
+        if response:
+            try:
+                self.set(provider, model, prompt, response, params)
+            except sqlite3.Error as e:
+                print(f"Error writing LLM cache: {e}")
+        return response
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+def lookup(provider, model, prompt, params=None):
+    """Cached response or None; errors and LLM_CACHE_DISABLED count as a miss."""
+    if DISABLED:
+        return None
+    try:
+        return get_cache().get(provider, model, prompt, params)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error reading LLM cache: {e}")
+        return None
+
+
+def store(provider, model, prompt, response, params=None):
+    """Cache a response obtained without get_or_call (e.g. a streamed one)."""
+    if DISABLED or not response:
+        return
+    try:
+        get_cache().set(provider, model, prompt, response, params)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error writing LLM cache: {e}")
+
+
+def cached_call(provider, model, prompt, call, params=None):
+    """get_cache().get_or_call(...), calling straight through if the cache is unusable."""
+    try:
+        cache = get_cache()
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error opening LLM cache: {e}")
+        return call()
+    return cache.get_or_call(provider, model, prompt, call, params)
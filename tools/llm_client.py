@@ -0,0 +1,92 @@
+"""
+Process-wide OpenAI client shared by the notes and funds blueprints.
+
+One client per worker process keeps its HTTP connection pool alive between
+requests, so LLM calls skip the TCP/TLS setup after the first one. Timeouts
+and retries (exponential backoff on connection errors, 429s and 5xx) are
+configured through LLM_TIMEOUT and LLM_MAX_RETRIES.
+"""
+
+import os
+import threading
+
+import openai
+from dotenv import load_dotenv
+
+import llm_cache
+
+load_dotenv()
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 120))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 256))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the shared OpenAI client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = openai.OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                timeout=LLM_TIMEOUT,
+                max_retries=LLM_MAX_RETRIES,
+            )
+        return _client
+
+
+def chat(prompt, model="gpt-4o", max_tokens=4000, temperature=0.5):
+    """
+    Send a single-message chat completion and return the stripped reply.
+    Identical requests are answered from the shared LLM response cache.
+    """
+
+    def call():
+        response = get_client().chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        return response.choices[0].message.content.strip()
+
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+    return llm_cache.cached_call("openai", model, prompt, call, params)
+
+
+def chat_stream(prompt, model="gpt-4o", max_tokens=4000, temperature=0.5):
+    """
+    Like chat(), but yield the reply in pieces as the model produces them.
+    A cached reply is yielded in one piece; a completed stream is cached.
+    """
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+    cached = llm_cache.lookup("openai", model, prompt, params)
+    if cached is not None:
+        yield cached
+        return
+
+    stream = get_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True,
+    )
+    parts = []
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield parts[-1]
+    llm_cache.store("openai", model, prompt, "".join(parts).strip(), params)
+
+
+def embed(texts):
+    """Return one embedding vector (list of floats) per input text."""
+    response = get_client().embeddings.create(
+        model=EMBEDDING_MODEL, input=list(texts), dimensions=EMBEDDING_DIMENSIONS
+    )
+    return [item.embedding for item in response.data]
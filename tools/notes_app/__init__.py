@@ -1,5 +1,7 @@
+import json
 import os
-import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from flask import (
     Blueprint,
     Flask,
@@ -8,12 +10,23 @@ from flask import (
     redirect,
     url_for,
     flash,
-    session,
+    jsonify,
+    Response,
+    stream_with_context,
+    copy_current_request_context,
+    has_request_context,
 )
-import openai
 from airtable import Airtable
 from dotenv import load_dotenv
 
+import llm_client
+from text_utils import strip_tags
+
+from . import jobs
+from .chunking import split_text
+from .replica import NotesReplica, note_hash
+from .vectors import VectorIndex
+
 notes_bp = Blueprint("notes", __name__, template_folder="templates")
 
 # Load environment variables from .env file
@@ -24,47 +37,67 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID")
 AIRTABLE_TABLE_NAME = os.getenv("AIRTABLE_TABLE_NAME")
 AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", 8))
+NOTES_PAGE_SIZE = int(os.getenv("NOTES_PAGE_SIZE", 20))
+# Characters of note text sent to the embedding model
+EMBEDDING_TEXT_LIMIT = 8000
+# Notes longer than this are formatted / summarized in parallel chunks
+NOTE_CHUNK_CHARS = int(os.getenv("NOTE_CHUNK_CHARS", 6000))
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", 10000))
+# Seconds between progress updates of a streaming note generation
+PROGRESS_INTERVAL = 0.5
+# Seconds a job stream stays open before the browser has to reconnect
+STREAM_MAX_SECONDS = 300
+# Notes per embeddings request when backfilling missing embeddings
+EMBEDDING_BATCH_SIZE = 100
 
 # --- Initialize Services ---
-try:
-    openai.api_key = OPENAI_API_KEY
-except Exception as e:
-    print(f"Error configuring OpenAI API: {e}")
-
 try:
     airtable = Airtable(AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME, api_key=AIRTABLE_API_KEY)
 except Exception as e:
     print(f"Error configuring Airtable: {e}")
     airtable = None
 
+# Local copy of the notes table; all reads go through it
+notes_store = NotesReplica(airtable) if airtable else None
+note_vectors = VectorIndex()
+
+llm_pool = ThreadPoolExecutor(max_workers=LLM_WORKERS)
+chunk_pool = ThreadPoolExecutor(max_workers=LLM_WORKERS)
+
 
 # --- Helper Functions ---
-def openai_chat(prompt, max_tokens=4000, temperature=0.5):
-    try:
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens,
-            temperature=temperature,
+def openai_chat(prompt, max_tokens=4000, temperature=0.5, stream=False):
+    """
+    Returns the reply text, or None on error. With stream=True returns an
+    iterator of text pieces instead; errors are then raised while iterating.
+    """
+    if stream:
+        return llm_client.chat_stream(
+            prompt, max_tokens=max_tokens, temperature=temperature
         )
-        return response.choices[0].message.content.strip()
+    try:
+        return llm_client.chat(prompt, max_tokens=max_tokens, temperature=temperature)
     except Exception as e:
         print(f"Error communicating with OpenAI: {e}")
-        flash(f"Error communicating with OpenAI: {e}", "error")
+        if has_request_context():
+            flash(f"Error communicating with OpenAI: {e}", "error")
         return None
 
 
-def process_with_openai(text_content):
-    """
-    Sends content to OpenAI to get HTML formatting.
-    Returns html_output or None on error.
-    """
-    prompt = f"""
+def html_format_prompt(text_content, part=None):
+    """`part` is (index, total) when the text is one chunk of a longer note."""
+    part_note = ""
+    if part:
+        part_note = (
+            f"- These notes are part {part[0]} of {part[1]} of a longer note: "
+            "format only this part, without adding an introduction or conclusion.\n"
+        )
+    return f"""
 Convert the following notes into clean, readable, semantically correct HTML for web display.
 
 Instructions:
-- Use <p>, <h1>-<h3>, <ul>, <ol>, <li>, <strong>, <em> as appropriate.
+{part_note}- Use <p>, <h1>-<h3>, <ul>, <ol>, <li>, <strong>, <em> as appropriate.
 - For code, use <pre><code> (add language class if possible), preserve formatting, and escape HTML chars.
 - For lists, use <ul> or <ol>.
 - Wrap URLs in <a> tags.
@@ -75,36 +108,70 @@ Instructions:
 Notes:
 {text_content}
 """
-    html_output = openai_chat(prompt)
+
+
+def process_with_openai(text_content):
+    """
+    Sends content to OpenAI to get HTML formatting.
+    Returns html_output or None on error.
+    """
+    chunks = split_text(text_content, NOTE_CHUNK_CHARS)
+    if len(chunks) == 1:
+        html_output = openai_chat(html_format_prompt(text_content))
+    else:
+        # Long note: format the chunks in parallel and join them in order
+        parts = map_chunks(
+            lambda chunk, part: openai_chat(html_format_prompt(chunk, part)), chunks
+        )
+        html_output = None if None in parts else "\n".join(p.strip() for p in parts)
     if not html_output:
         return None, None
     return html_output, None
 
 
+def summary_prompt(text):
+    return f"""
+Summarize the following text as concise bullet points (one point per line, no numbering, no extra text):
+
+---
+{text}
+---
+"""
+
+
 def summarize_with_openai(html_content_to_summarize):
     """
     Sends HTML content to OpenAI to get a summary as bullet points.
+    Long notes are summarized chunk by chunk in parallel, then the partial
+    summaries are condensed into one list.
     Returns summary text or None on error.
     """
-    text_for_summary = re.sub("<[^<]+?>", "", html_content_to_summarize)
-    text_for_summary = text_for_summary[:10000]
-
+    text_for_summary = strip_tags(html_content_to_summarize)
+    chunks = split_text(text_for_summary, SUMMARY_CHUNK_CHARS)
+    if len(chunks) == 1:
+        return openai_chat(summary_prompt(chunks[0]), max_tokens=200)
+
+    partial_summaries = map_chunks(
+        lambda chunk, part: openai_chat(summary_prompt(chunk), max_tokens=200),
+        chunks,
+    )
+    if None in partial_summaries:
+        return None
+    combined = "\n".join(partial_summaries)
     prompt = f"""
-Summarize the following text as concise bullet points (one point per line, no numbering, no extra text):
+The following bullet points summarize consecutive parts of one note.
+Condense them into a single list of concise bullet points covering the whole note
+(one point per line, no numbering, no extra text):
 
 ---
-{text_for_summary}
+{combined}
 ---
 """
     return openai_chat(prompt, max_tokens=200)
 
 
-def generate_note_from_title_with_openai(title_for_note):
-    """
-    Generates initial note content based on a title using OpenAI.
-    Returns generated text content or None on error.
-    """
-    prompt = f"""
+def note_draft_prompt(title_for_note):
+    return f"""
 You are a helpful assistant. Please generate a short draft for a note based on the following title.
 The content should be a few paragraphs, suitable for a starting point.
 Do not include any HTML formatting in this initial draft.
@@ -114,7 +181,14 @@ TITLE: "{title_for_note}"
 
 DRAFT CONTENT:
 """
-    return openai_chat(prompt, max_tokens=10000)
+
+
+def generate_note_from_title_with_openai(title_for_note):
+    """
+    Generates initial note content based on a title using OpenAI.
+    Returns generated text content or None on error.
+    """
+    return openai_chat(note_draft_prompt(title_for_note), max_tokens=10000)
 
 
 def generate_title_with_openai(note_content):
@@ -133,6 +207,77 @@ Content:
     return title
 
 
+def embedding_text(note):
+    text = f"{note.get('Title', '')}\n\n{strip_tags(note.get('HTMLContent'))}"
+    return text[:EMBEDDING_TEXT_LIMIT]
+
+
+def save_note(note_data):
+    """
+    Save a note to Airtable and the local replica, and queue its embedding.
+    Returns the Airtable record.
+    """
+    record = notes_store.insert(note_data)
+    queue_embedding(record["id"])
+    return record
+
+
+def queue_embedding(note_id):
+    """Queue the note's embedding, once, if embeddings can be computed."""
+    if OPENAI_API_KEY:
+        jobs.enqueue("embed_note", {"note_id": note_id}, unique=True)
+
+
+def related_notes(note_id, limit=5):
+    """
+    Notes most similar to `note_id` by embedding. Falls back to the latest
+    notes (and queues the embedding) while the note has none yet.
+    """
+    if note_id in note_vectors:
+        matches = note_vectors.related(note_id, k=limit)
+        return notes_store.get_briefs([match_id for match_id, _ in matches]), True
+
+    queue_embedding(note_id)
+    latest = [n for n in notes_store.latest_notes(limit + 1) if n["id"] != note_id]
+    return latest[:limit], False
+
+
+def run_concurrently(*calls):
+    """
+    Run independent (function, *args) calls on the LLM thread pool and return
+    their results in order. Each call sees the current request context, so
+    helpers can still flash errors.
+    """
+    futures = [
+        llm_pool.submit(copy_current_request_context(function), *args)
+        for function, *args in calls
+    ]
+    return [future.result() for future in futures]
+
+
+def map_chunks(function, chunks):
+    """
+    Call `function(chunk, (index, total))` for every chunk on the chunk pool
+    and return the results in chunk order. Uses its own pool because callers
+    may already be running on llm_pool.
+    """
+
+    def submit(*args):
+        if has_request_context():
+            return chunk_pool.submit(copy_current_request_context(function), *args)
+        return chunk_pool.submit(function, *args)
+
+    futures = [
+        submit(chunk, (index, len(chunks))) for index, chunk in enumerate(chunks, 1)
+    ]
+    return [future.result() for future in futures]
+
+
+@notes_bp.before_app_request
+def start_job_workers():
+    jobs.start_workers()
+
+
 def get_all_categories():
     """Return the list of categories for the dropdown."""
     return ["aws", "kubernetes", "networking"]
@@ -155,14 +300,19 @@ def index():
             return redirect(url_for("notes.index"))
 
         if not title:
-            # Auto-generate title if not provided
-            title = generate_title_with_openai(content)
+            # Auto-generate title if not provided; it only depends on the
+            # content, so it runs alongside the HTML formatting
+            title, (html_content, _) = run_concurrently(
+                (generate_title_with_openai, content),
+                (process_with_openai, content),
+            )
             if not title:
                 flash("Failed to generate title.", "error")
                 return redirect(url_for("notes.index"))
             title = title[:100]
+        else:
+            html_content, _ = process_with_openai(content)
 
-        html_content, _ = process_with_openai(content)
         if html_content is None:
             return redirect(url_for("notes.index"))
 
@@ -172,7 +322,7 @@ def index():
                 "HTMLContent": html_content,
                 "Category": category,
             }
-            airtable.insert(note_data)
+            save_note(note_data)
             flash("Note saved successfully!", "success")
         except Exception as e:
             print(f"Error saving to Airtable: {e}")
@@ -181,19 +331,20 @@ def index():
 
     # Search/filter logic
     category_query = request.args.get("category", "")
+    cursor = request.args.get("cursor")
+    page_size = max(
+        1, min(request.args.get("page_size", NOTES_PAGE_SIZE, type=int), 100)
+    )
     notes_to_display = []
+    next_cursor = None
     try:
-        formula = ""
-        if category_query:
-            escaped_category = category_query.replace("'", "\\'")
-            formula = f"{{Category}} = '{escaped_category}'"
-        all_notes_raw = airtable.get_all(formula=formula, sort=[("CreatedAt", "desc")])
-        for record in all_notes_raw:
-            notes_to_display.append({"id": record["id"], **record.get("fields", {})})
-        if category_query and not notes_to_display:
+        notes_to_display, next_cursor = notes_store.list_page(
+            category=category_query, cursor=cursor, page_size=page_size
+        )
+        if category_query and not notes_to_display and not cursor:
             flash(f"No notes found in category '{category_query}'.", "info")
     except Exception as e:
-        print(f"Error fetching notes from Airtable: {e}")
+        print(f"Error fetching notes: {e}")
         flash(f"Error fetching notes: {e}", "error")
         notes_to_display = []
 
@@ -203,9 +354,53 @@ def index():
         notes=notes_to_display,
         category_query=category_query,
         all_categories=all_categories,
+        job_id=request.args.get("job"),
+        cursor=cursor,
+        next_cursor=next_cursor,
+        page_size=page_size,
     )
 
 
+@notes_bp.route("/search")
+def search():
+    if not notes_store:
+        return jsonify({"error": "Airtable not configured."}), 503
+
+    query = request.args.get("q", "")
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+    try:
+        results = notes_store.search(query, limit=limit)
+    except Exception as e:
+        print(f"Error searching notes: {e}")
+        return jsonify({"error": str(e)}), 500
+    for result in results:
+        result["url"] = url_for("notes.view_note", note_id=result["id"])
+    return jsonify({"results": results})
+
+
+@notes_bp.route("/semantic_search")
+def semantic_search():
+    if not notes_store or not OPENAI_API_KEY:
+        return jsonify({"error": "Airtable or OpenAI API not configured."}), 503
+
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"results": []})
+    limit = max(1, min(request.args.get("limit", 10, type=int), 100))
+    try:
+        matches = note_vectors.top_k(llm_client.embed([query])[0], k=limit)
+    except Exception as e:
+        print(f"Error in semantic search: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    scores = dict(matches)
+    results = notes_store.get_briefs([note_id for note_id, _ in matches])
+    for result in results:
+        result["score"] = scores[result["id"]]
+        result["url"] = url_for("notes.view_note", note_id=result["id"])
+    return jsonify({"results": results})
+
+
 @notes_bp.route("/generate_note", methods=["POST"])
 def generate_note_route():
     if not airtable or not OPENAI_API_KEY:
@@ -218,28 +413,192 @@ def generate_note_route():
         flash("Title is required to generate a note.", "error")
         return redirect(url_for("notes.index"))
 
-    draft_content = generate_note_from_title_with_openai(title)
+    job_id = jobs.enqueue("generate_note", {"title": title, "category": category})
+    flash(f"Generating note '{title}' in the background...", "info")
+    return redirect(url_for("notes.index", job=job_id))
+
+
+def stream_to_job(stage, pieces):
+    """
+    Join streamed reply pieces, publishing the text so far as the running
+    job's progress at most every PROGRESS_INTERVAL seconds.
+    """
+    text, reported_at = "", 0.0
+    for piece in pieces:
+        text += piece
+        if time.monotonic() - reported_at >= PROGRESS_INTERVAL:
+            jobs.report_progress(stage, text)
+            reported_at = time.monotonic()
+    jobs.report_progress(stage, text)
+    return text.strip()
+
+
+def run_generate_note_job(payload):
+    """
+    Background job: draft a note from its title, format it and save it. The
+    draft and (for single-chunk notes) the HTML are streamed into the job's
+    progress as they are written. The created record id is checkpointed, so a
+    re-run of the same job returns it instead of saving the note twice.
+    """
+    title = payload["title"]
+    note_id = jobs.get_checkpoint("note_id")
+    if note_id:
+        return {"note_id": note_id, "title": title}
+
+    draft_content = stream_to_job(
+        "draft",
+        openai_chat(note_draft_prompt(title), max_tokens=10000, stream=True),
+    )
     if not draft_content:
-        return redirect(url_for("notes.index"))
+        raise RuntimeError("Failed to generate note content from OpenAI.")
 
-    html_content, _ = process_with_openai(draft_content)
-    if html_content is None:
-        flash("Failed to process the generated content from OpenAI.", "error")
-        return redirect(url_for("notes.index"))
+    if len(split_text(draft_content, NOTE_CHUNK_CHARS)) == 1:
+        html_content = stream_to_job(
+            "html", openai_chat(html_format_prompt(draft_content), stream=True)
+        )
+    else:
+        html_content, _ = process_with_openai(draft_content)
+    if not html_content:
+        raise RuntimeError("Failed to process the generated content from OpenAI.")
+
+    note_data = {
+        "Title": title,
+        "HTMLContent": html_content,
+        "Category": payload["category"],
+    }
+    record = save_note(note_data)
+    jobs.checkpoint("note_id", record["id"])
+    return {"note_id": record["id"], "title": title}
+
+
+def run_embed_note_job(payload):
+    """Background job: compute and store the embedding of a saved note."""
+    note_id = payload["note_id"]
+    note = notes_store.get_note(note_id)
+    if not note:
+        raise ValueError(f"Note {note_id} not found")
+    content_hash = note_hash(note)
+    if not note_vectors.stale({note_id: content_hash}):
+        return {"note_id": note_id, "skipped": True}
+    note_vectors.add(note_id, llm_client.embed([embedding_text(note)])[0], content_hash)
+    return {"note_id": note_id}
+
+
+def run_embed_missing_notes_job(payload):
+    """
+    Background job: bring the index in line with the replica. Drops the
+    vectors of deleted notes and embeds notes that are new or were edited.
+    """
+    hashes = notes_store.note_hashes()
+    removed = note_vectors.retain(hashes)
+    stale = note_vectors.stale(hashes)
+    for start in range(0, len(stale), EMBEDDING_BATCH_SIZE):
+        batch = stale[start : start + EMBEDDING_BATCH_SIZE]
+        notes = [notes_store.get_note(note_id) for note_id in batch]
+        vectors = llm_client.embed([embedding_text(note) for note in notes])
+        note_vectors.add_many(
+            dict(zip(batch, vectors)), {note["id"]: note_hash(note) for note in notes}
+        )
+    return {"embedded": len(stale), "removed": removed}
 
-    try:
-        note_data = {
-            "Title": title,
-            "HTMLContent": html_content,
-            "Category": category,
-        }
-        airtable.insert(note_data)
-        flash(f"Note '{title}' generated and saved successfully! ✨", "success")
-    except Exception as e:
-        print(f"Error saving generated note to Airtable: {e}")
-        flash(f"Error saving generated note to Airtable: {e}", "error")
 
-    return redirect(url_for("notes.index"))
+def run_sync_notes_job(payload):
+    """
+    Background job: bring the local replica up to date with Airtable, then
+    queue bringing the embeddings up to date with it.
+    """
+    synced = notes_store.sync_if_stale()
+    if synced is not None and OPENAI_API_KEY:
+        jobs.enqueue("embed_missing_notes", {}, unique=True)
+    return {"synced": synced}
+
+
+jobs.register("generate_note", run_generate_note_job)
+jobs.register("embed_note", run_embed_note_job)
+jobs.register("embed_missing_notes", run_embed_missing_notes_job)
+jobs.register("sync_notes", run_sync_notes_job)
+
+
+def job_with_links(job_id):
+    """The job as returned by /jobs/<id>: with its progress and note URL."""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return None
+    job["progress"] = jobs.get_progress(job_id)
+    if job["status"] == "done" and job["result"] and "note_id" in job["result"]:
+        job["note_url"] = url_for("notes.view_note", note_id=job["result"]["note_id"])
+    return job
+
+
+@notes_bp.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = job_with_links(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@notes_bp.route("/jobs/<job_id>/stream")
+def job_stream(job_id):
+    """
+    Server-sent events view of a job: "progress" events with the text the
+    job has written since the last one ({"stage", "offset", "text"}, where
+    offset is where the text goes in the stage's output), then one "done" or
+    "failed" event. Only reads the job's row; the work runs on the job queue.
+
+    Intervals without news send a keepalive comment, so a closed tab fails
+    the write and frees the worker thread, and the stream ends after
+    STREAM_MAX_SECONDS. EventSource then reconnects and the new stream
+    resends the current stage from offset 0.
+    """
+    if jobs.get_job(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def events():
+        stage, sent = None, 0
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            job = job_with_links(job_id)
+            if job is None:
+                yield sse_event("failed", "Job not found")
+                return
+            progress = job["progress"]
+            keepalive = True
+            if progress:
+                if progress["stage"] != stage:
+                    stage, sent = progress["stage"], 0
+                if len(progress["text"]) > sent:
+                    yield sse_event(
+                        "progress",
+                        {
+                            "stage": stage,
+                            "offset": sent,
+                            "text": progress["text"][sent:],
+                        },
+                    )
+                    sent = len(progress["text"])
+                    keepalive = False
+            if job["status"] == "done":
+                job.pop("progress")
+                yield sse_event("done", job)
+                return
+            if job["status"] == "failed":
+                yield sse_event("failed", job["error"])
+                return
+            if keepalive:
+                yield ": keepalive\n\n"
+            time.sleep(PROGRESS_INTERVAL)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @notes_bp.route("/note/<note_id>", methods=["GET", "POST"])
@@ -248,20 +607,24 @@ def view_note(note_id):
         flash("Airtable not configured. Cannot fetch note.", "error")
         return redirect(url_for("notes.index"))
 
-    summary = session.pop(f"summary_{note_id}", None)
-
     if request.method == "POST":
         if not OPENAI_API_KEY:
             flash("OpenAI API not configured for summarization.", "error")
         else:
             try:
-                record = airtable.get(note_id)
-                if record and "fields" in record and "HTMLContent" in record["fields"]:
-                    html_to_summarize = record["fields"]["HTMLContent"]
-                    summary_text = summarize_with_openai(html_to_summarize)
-                    if summary_text:
-                        session[f"summary_{note_id}"] = summary_text
+                note = notes_store.get_note(note_id)
+                if note and "HTMLContent" in note:
+                    html_to_summarize = note["HTMLContent"]
+                    # Summaries are shared by everyone until the note changes
+                    if notes_store.get_summary(note_id, html_to_summarize):
                         flash("Summary generated! ✨", "success")
+                    else:
+                        summary_text = summarize_with_openai(html_to_summarize)
+                        if summary_text:
+                            notes_store.save_summary(
+                                note_id, html_to_summarize, summary_text
+                            )
+                            flash("Summary generated! ✨", "success")
                 else:
                     flash("Note content not found for summarization.", "error")
             except Exception as e:
@@ -270,26 +633,23 @@ def view_note(note_id):
         return redirect(url_for("notes.view_note", note_id=note_id))
 
     try:
-        record = airtable.get(note_id)
-        if record and "fields" in record:
-            note = {"id": record["id"], **record["fields"]}
+        note = notes_store.get_note(note_id)
+        if note:
+            summary = notes_store.get_summary(note_id, note.get("HTMLContent"))
 
-            # Fetch latest notes for sidebar
-            latest_notes = []
+            # Related notes for sidebar
+            sidebar_notes, related = [], False
             try:
-                all_notes_raw = airtable.get_all(
-                    sort=[("CreatedAt", "desc")], maxRecords=5
-                )
-                for record in all_notes_raw:
-                    if record["id"] != note_id:
-                        latest_notes.append(
-                            {"id": record["id"], **record.get("fields", {})}
-                        )
+                sidebar_notes, related = related_notes(note_id)
             except Exception as e:
-                latest_notes = []
+                print(f"Error finding related notes: {e}")
 
             return render_template(
-                "view_note.html", note=note, summary=summary, latest_notes=latest_notes
+                "view_note.html",
+                note=note,
+                summary=summary,
+                latest_notes=sidebar_notes,
+                related=related,
             )
         else:
             flash("Note not found.", "error")
@@ -0,0 +1,108 @@
+"""
+Split long note text into chunks that can be sent to the LLM in parallel.
+
+Chunks break at section and paragraph boundaries and are packed greedily up
+to a character limit, so joining the processed chunks in order rebuilds the
+whole note. Code fences are kept whole unless a fence alone is longer than
+the limit; it is then cut at line breaks, and each piece closes the fence
+and the next one reopens it, so every chunk has balanced fences.
+"""
+
+import re
+
+HEADING = re.compile(r"#{1,6}\s")
+FENCE = re.compile(r"\s*(```|~~~)")
+
+
+def _blocks(text):
+    """Paragraphs of text (blank-line separated), keeping code fences whole."""
+    block, in_fence = [], False
+    for line in text.splitlines():
+        if FENCE.match(line):
+            in_fence = not in_fence
+        if not line.strip() and not in_fence:
+            if block:
+                yield "\n".join(block)
+                block = []
+            continue
+        block.append(line)
+    if block:
+        yield "\n".join(block)
+
+
+def _wrap(line, width):
+    """Cut a line longer than width at spaces (or anywhere if there are none)."""
+    while len(line) > width:
+        cut = line.rfind(" ", 0, width)
+        if cut <= 0:
+            cut = width
+        yield line[:cut]
+        line = line[cut:].lstrip()
+    yield line
+
+
+def _split_block(block, max_chars):
+    """
+    Cut a block longer than max_chars at line breaks, then at spaces. Inside a
+    code fence each piece ends with a closing fence line and the next one
+    starts with the opening line again.
+    """
+    pieces, lines = [], []
+    opening = closing = None
+
+    def size(extra):
+        return sum(len(line) + 1 for line in lines) + len(extra)
+
+    for line in block.split("\n"):
+        fence = FENCE.match(line)
+        if fence and opening is None:
+            # Room for the closing line this opening line will need
+            reserve = len(fence.group(0)) + 1
+        elif opening is not None and not fence:
+            reserve = len(closing) + 1
+        else:
+            reserve = 0
+        header = len(opening) + 1 if opening is not None else 0
+        for segment in _wrap(line, max(max_chars - reserve - header, 1)):
+            has_content = len(lines) > (1 if opening is not None else 0)
+            if has_content and size(segment) + reserve > max_chars:
+                if opening is not None:
+                    lines.append(closing)
+                pieces.append("\n".join(lines))
+                lines = [opening] if opening is not None else []
+            lines.append(segment)
+        if fence:
+            if opening is None:
+                opening, closing = line, fence.group(0)
+            else:
+                opening = closing = None
+    if lines:
+        pieces.append("\n".join(lines))
+    return pieces
+
+
+def split_text(text, max_chars):
+    """
+    Return the text as a list of chunks of at most max_chars characters
+    (a single chunk when it already fits). A heading starts a new chunk once
+    the current one is half full, so sections tend to stay together.
+    """
+    text = (text or "").strip()
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks, current = [], ""
+    for block in _blocks(text):
+        for piece in (
+            [block] if len(block) <= max_chars else _split_block(block, max_chars)
+        ):
+            starts_section = HEADING.match(piece) and len(current) >= max_chars // 2
+            if current and (
+                starts_section or len(current) + 2 + len(piece) > max_chars
+            ):
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
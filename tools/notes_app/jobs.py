@@ -0,0 +1,306 @@
+"""
+Small persistent job queue for slow note work (LLM calls, Airtable writes).
+
+Jobs are rows in a SQLite file so they survive restarts and are visible to
+every gunicorn worker. Each process runs NOTES_JOB_WORKERS threads that claim
+queued jobs one at a time and run the handler registered for the job's kind.
+While a job runs its row is touched every HEARTBEAT_INTERVAL seconds, so
+only jobs left 'running' by a process that died are re-queued (after
+NOTES_JOB_STALE_AFTER seconds without a heartbeat). Finished jobs are
+deleted after NOTES_JOB_RETENTION seconds.
+
+Handlers can publish partial output with report_progress(); readers such as
+the note generation stream poll it with get_progress() instead of doing the
+work themselves. A re-queued job runs its handler again, so handlers record
+side effects that must not repeat (like creating a note) with checkpoint()
+and check get_checkpoint() first.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+
+from sqlite_store import Database, data_path
+
+QUEUE_PATH = data_path("NOTES_JOBS_PATH", "jobs.sqlite3")
+WORKERS = int(os.environ.get("NOTES_JOB_WORKERS", 2))
+STALE_AFTER = int(os.environ.get("NOTES_JOB_STALE_AFTER", 15 * 60))
+RETENTION = int(os.environ.get("NOTES_JOB_RETENTION", 7 * 24 * 60 * 60))
+POLL_INTERVAL = 1.0
+HEARTBEAT_INTERVAL = 60
+PRUNE_INTERVAL = 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_progress (
+    job_id TEXT PRIMARY KEY,
+    stage TEXT NOT NULL,
+    text TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_checkpoints (
+    job_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (job_id, name)
+);
+"""
+
+_handlers = {}
+_wakeup = threading.Event()
+_workers_lock = threading.Lock()
+_workers_pid = None
+# The job each worker thread is running, for report_progress()
+_current = threading.local()
+# Autocommit, so _claim can manage its own BEGIN IMMEDIATE transaction
+_db = Database(QUEUE_PATH, SCHEMA, isolation_level=None)
+
+
+def _connect():
+    return _db.connect()
+
+
+def register(kind, handler):
+    """Run `handler(payload)` for jobs of `kind`; its return value is the result."""
+    _handlers[kind] = handler
+
+
+def enqueue(kind, payload, unique=False):
+    """
+    Queue a job and return its id. With `unique`, a queued or running job of
+    the same kind and payload is reused instead of adding another one.
+    """
+    job_id = uuid.uuid4().hex
+    payload = json.dumps(payload, sort_keys=True)
+    now = time.time()
+    with closing(_connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = None
+            if unique:
+                existing = conn.execute(
+                    "SELECT id FROM jobs WHERE kind = ? AND payload = ? "
+                    "AND status IN ('queued', 'running') LIMIT 1",
+                    (kind, payload),
+                ).fetchone()
+            if existing:
+                job_id = existing[0]
+            else:
+                conn.execute(
+                    "INSERT INTO jobs "
+                    "(id, kind, payload, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 'queued', ?, ?)",
+                    (job_id, kind, payload, now, now),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    if existing:
+        return job_id
+    start_workers()
+    _wakeup.set()
+    return job_id
+
+
+def get_job(job_id):
+    """Return the job as a dict, or None if it doesn't exist."""
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT id, kind, status, result, error, created_at, updated_at "
+            "FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+    if row is None:
+        return None
+    return {
+        "id": row[0],
+        "kind": row[1],
+        "status": row[2],
+        "result": json.loads(row[3]) if row[3] else None,
+        "error": row[4],
+        "created_at": row[5],
+        "updated_at": row[6],
+    }
+
+
+def report_progress(stage, text):
+    """Record the partial output of the job running on this thread."""
+    job_id = getattr(_current, "job_id", None)
+    if job_id is None:
+        return
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO job_progress (job_id, stage, text, updated_at) "
+            "VALUES (?, ?, ?, ?)",
+            (job_id, stage, text, time.time()),
+        )
+
+
+def get_progress(job_id):
+    """The job's last reported {"stage", "text"}, or None."""
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT stage, text FROM job_progress WHERE job_id = ?", (job_id,)
+        ).fetchone()
+    return {"stage": row[0], "text": row[1]} if row else None
+
+
+def checkpoint(name, value):
+    """Remember `value` for the job running on this thread, across re-runs."""
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO job_checkpoints (job_id, name, value) "
+            "VALUES (?, ?, ?)",
+            (_current.job_id, name, json.dumps(value)),
+        )
+
+
+def get_checkpoint(name):
+    """The value checkpointed under `name` by an earlier run of this job, or None."""
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT value FROM job_checkpoints WHERE job_id = ? AND name = ?",
+            (_current.job_id, name),
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _claim(conn):
+    """Atomically move the oldest queued job to 'running' and return it."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', updated_at = ? "
+            "WHERE status = 'running' AND updated_at < ?",
+            (time.time(), time.time() - STALE_AFTER),
+        )
+        row = conn.execute(
+            "SELECT id, kind, payload FROM jobs WHERE status = 'queued' "
+            "ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ?",
+                (time.time(), row[0]),
+            )
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _finish(conn, job_id, status, result=None, error=None):
+    conn.execute(
+        "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? "
+        "WHERE id = ?",
+        (
+            status,
+            json.dumps(result) if result is not None else None,
+            error,
+            time.time(),
+            job_id,
+        ),
+    )
+
+
+@contextmanager
+def _heartbeat(job_id):
+    """Keep refreshing the running job's updated_at until the block exits."""
+    stop = threading.Event()
+
+    def beat():
+        with closing(_connect()) as conn:
+            while not stop.wait(HEARTBEAT_INTERVAL):
+                try:
+                    conn.execute(
+                        "UPDATE jobs SET updated_at = ? "
+                        "WHERE id = ? AND status = 'running'",
+                        (time.time(), job_id),
+                    )
+                except sqlite3.Error as e:
+                    print(f"Error refreshing job {job_id}: {e}")
+
+    thread = threading.Thread(target=beat, name=f"notes-job-heartbeat-{job_id}")
+    thread.daemon = True
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _prune(conn):
+    """Delete finished jobs older than RETENTION, with their progress."""
+    conn.execute(
+        "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+        (time.time() - RETENTION,),
+    )
+    for table in ("job_progress", "job_checkpoints"):
+        conn.execute(f"DELETE FROM {table} WHERE job_id NOT IN (SELECT id FROM jobs)")
+
+
+def _run(conn, job_id, kind, payload):
+    handler = _handlers.get(kind)
+    try:
+        if handler is None:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        _current.job_id = job_id
+        with _heartbeat(job_id):
+            result = handler(json.loads(payload))
+    except Exception as e:
+        print(f"Job {job_id} ({kind}) failed: {e}")
+        _finish(conn, job_id, "failed", error=str(e))
+        return
+    finally:
+        _current.job_id = None
+    _finish(conn, job_id, "done", result=result)
+
+
+def _work():
+    last_prune = 0.0
+    with closing(_connect()) as conn:
+        while True:
+            # Never let an error (say a lock timeout in _finish) end the
+            # thread: start_workers won't start another one in this process.
+            # A job left 'running' is picked up again once it goes stale.
+            try:
+                if time.time() - last_prune >= PRUNE_INTERVAL:
+                    last_prune = time.time()
+                    _prune(conn)
+                job = _claim(conn)
+                if job is None:
+                    _wakeup.wait(POLL_INTERVAL)
+                    _wakeup.clear()
+                    continue
+                _run(conn, *job)
+            except Exception as e:
+                print(f"Error in notes job worker: {e}")
+                time.sleep(POLL_INTERVAL)
+
+
+def start_workers():
+    """Start this process's worker threads once (again after a fork)."""
+    global _workers_pid
+    with _workers_lock:
+        if _workers_pid == os.getpid():
+            return
+        _workers_pid = os.getpid()
+        for i in range(WORKERS):
+            threading.Thread(target=_work, name=f"notes-job-{i}", daemon=True).start()
@@ -0,0 +1,377 @@
+"""
+Local SQLite replica of the Airtable notes table.
+
+Reads are served from the replica. It is kept fresh by an incremental sync
+that only asks Airtable for records modified since the previous sync (at most
+every NOTES_SYNC_INTERVAL seconds), plus a full resync every
+NOTES_FULL_SYNC_INTERVAL seconds to drop records deleted in Airtable. Syncs
+run as a single "sync_notes" job on the job queue, so reads never wait for
+Airtable and keep serving the current replica while a sync runs. Writes go
+to Airtable first and then update the replica.
+"""
+
+import base64
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+
+from sqlite_store import Database, data_path
+from text_utils import strip_tags
+
+from . import jobs
+
+REPLICA_PATH = data_path("NOTES_REPLICA_PATH", "notes.sqlite3")
+SYNC_INTERVAL = int(os.environ.get("NOTES_SYNC_INTERVAL", 60))
+FULL_SYNC_INTERVAL = int(os.environ.get("NOTES_FULL_SYNC_INTERVAL", 24 * 60 * 60))
+# Name of a "Last modified time" field in Airtable; without one the sync
+# filters on the LAST_MODIFIED_TIME() formula instead
+MODIFIED_FIELD = os.environ.get("AIRTABLE_MODIFIED_FIELD")
+# Overlap between syncs so clock skew can't make us miss an edit
+SYNC_OVERLAP = timedelta(minutes=1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    category TEXT,
+    created_at TEXT,
+    fields TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notes_recent ON notes (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS notes_category_recent
+    ON notes (category, created_at DESC, id DESC);
+-- Search rows share the rowid of their note, so they can be replaced by rowid
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+    title,
+    body,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    note_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _encode_cursor(created_at, note_id):
+    raw = json.dumps([created_at, note_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        created_at, note_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid page cursor")
+    return created_at, note_id
+
+
+def _match_query(query):
+    """
+    Turn free text into an FTS5 query: every word must match, the last one
+    as a prefix so results show up while typing.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def content_hash(html_content):
+    return hashlib.sha256((html_content or "").encode()).hexdigest()
+
+
+def note_hash(note):
+    """Hash of the parts of a note its embedding is computed from."""
+    return content_hash(f"{note.get('Title') or ''}\n\n{note.get('HTMLContent') or ''}")
+
+
+def _to_note(note_id, fields):
+    return {"id": note_id, **json.loads(fields)}
+
+
+class NotesReplica:
+    def __init__(self, airtable, path=REPLICA_PATH):
+        self.airtable = airtable
+        self.path = path
+        self.db = Database(path, SCHEMA)
+        with closing(self._connect()) as conn:
+            self._rebuild_search_index_if_needed(conn)
+
+    def _connect(self):
+        return self.db.connect()
+
+    # --- Sync ---
+    def _get_state(self, conn, key):
+        row = conn.execute(
+            "SELECT value FROM sync_state WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, conn, key, value):
+        conn.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+            (key, str(value)),
+        )
+
+    def _upsert(self, conn, record, reindex=True):
+        """
+        Insert or update a record. The note keeps its rowid on update, and its
+        old search row is only deleted if `reindex` (a full sync has already
+        emptied the search index).
+        """
+        fields = record.get("fields", {})
+        conn.execute(
+            "INSERT INTO notes (id, title, category, created_at, fields) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET title = excluded.title, "
+            "category = excluded.category, created_at = excluded.created_at, "
+            "fields = excluded.fields",
+            (
+                record["id"],
+                fields.get("Title"),
+                fields.get("Category"),
+                fields.get("CreatedAt") or record.get("createdTime") or "",
+                json.dumps(fields),
+            ),
+        )
+        rowid = conn.execute(
+            "SELECT rowid FROM notes WHERE id = ?", (record["id"],)
+        ).fetchone()[0]
+        if reindex:
+            conn.execute("DELETE FROM notes_fts WHERE rowid = ?", (rowid,))
+        self._index_note(conn, rowid, fields)
+
+    def _index_note(self, conn, rowid, fields):
+        conn.execute(
+            "INSERT INTO notes_fts (rowid, title, body) VALUES (?, ?, ?)",
+            (rowid, fields.get("Title") or "", strip_tags(fields.get("HTMLContent"))),
+        )
+
+    def _rebuild_search_index_if_needed(self, conn):
+        """Index notes replicated before the search index existed."""
+        indexed = conn.execute("SELECT COUNT(*) FROM notes_fts").fetchone()[0]
+        total = conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+        if indexed == total:
+            return
+        with conn:
+            conn.execute("DELETE FROM notes_fts")
+            for rowid, fields in conn.execute("SELECT rowid, fields FROM notes"):
+                self._index_note(conn, rowid, json.loads(fields))
+
+    def sync(self, full=False):
+        """Pull changed records (or all of them) from Airtable into the replica."""
+        started = datetime.now(timezone.utc)
+        with closing(self._connect()) as conn:
+            last_sync = self._get_state(conn, "synced_at")
+            last_full = float(self._get_state(conn, "full_synced_at") or 0)
+            full = (
+                full
+                or last_sync is None
+                or time.time() - last_full >= FULL_SYNC_INTERVAL
+            )
+
+            if full:
+                records = self.airtable.get_all()
+            else:
+                since = datetime.fromisoformat(last_sync) - SYNC_OVERLAP
+                modified = (
+                    f"{{{MODIFIED_FIELD}}}"
+                    if MODIFIED_FIELD
+                    else "LAST_MODIFIED_TIME()"
+                )
+                records = self.airtable.get_all(
+                    formula=f"IS_AFTER({modified}, DATETIME_PARSE('{since.isoformat()}'))"
+                )
+
+            with conn:
+                if full:
+                    conn.execute("DELETE FROM notes")
+                    conn.execute("DELETE FROM notes_fts")
+                    self._set_state(conn, "full_synced_at", time.time())
+                for record in records:
+                    self._upsert(conn, record, reindex=not full)
+                self._set_state(conn, "synced_at", started.isoformat())
+                self._set_state(conn, "checked_at", time.time())
+        return len(records)
+
+    def is_stale(self):
+        """True if the last sync check is older than SYNC_INTERVAL."""
+        with closing(self._connect()) as conn:
+            checked_at = float(self._get_state(conn, "checked_at") or 0)
+        return time.time() - checked_at >= SYNC_INTERVAL
+
+    def sync_if_stale(self):
+        """
+        Run a sync if the replica is stale; the "sync_notes" job handler.
+        Returns the number of records pulled, or None if it was fresh.
+        """
+        if not self.is_stale():
+            return None
+        try:
+            return self.sync()
+        except Exception:
+            # Back off instead of retrying on every request while Airtable is down
+            with closing(self._connect()) as conn:
+                with conn:
+                    self._set_state(conn, "checked_at", time.time())
+            raise
+
+    def _schedule_sync(self):
+        """Queue a background sync if stale; at most one is queued at a time."""
+        if self.is_stale():
+            jobs.enqueue("sync_notes", {}, unique=True)
+
+    # --- Reads ---
+    def list_page(self, category=None, cursor=None, page_size=20):
+        """
+        One page of notes, newest first, with only id, Title and Category.
+        Returns (notes, next_cursor); next_cursor is None on the last page.
+        """
+        self._schedule_sync()
+        query = "SELECT id, title, category, created_at FROM notes"
+        conditions, params = [], []
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        if cursor:
+            created_at, note_id = _decode_cursor(cursor)
+            conditions.append("(created_at, id) < (?, ?)")
+            params += [created_at, note_id]
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(page_size + 1)
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        notes = [
+            {"id": note_id, "Title": title, "Category": category}
+            for note_id, title, category, _ in rows[:page_size]
+        ]
+        next_cursor = None
+        if len(rows) > page_size:
+            last = rows[page_size - 1]
+            next_cursor = _encode_cursor(last[3], last[0])
+        return notes, next_cursor
+
+    def search(self, query, limit=20):
+        """
+        Full-text search over titles and note text, best match first (BM25,
+        title matches weighted higher). Each result carries an HTML-escaped
+        snippet with the matched words in <mark>.
+        """
+        match = _match_query(query)
+        if not match:
+            return []
+        self._schedule_sync()
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT notes.id, notes.title, notes.category, "
+                "snippet(notes_fts, 1, char(2), char(3), '...', 16) "
+                "FROM notes_fts JOIN notes ON notes.rowid = notes_fts.rowid "
+                "WHERE notes_fts MATCH ? "
+                "ORDER BY bm25(notes_fts, 10.0, 1.0) LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        return [
+            {
+                "id": note_id,
+                "Title": title,
+                "Category": category,
+                "snippet": html.escape(snippet)
+                .replace("\x02", "<mark>")
+                .replace("\x03", "</mark>"),
+            }
+            for note_id, title, category, snippet in rows
+        ]
+
+    def latest_notes(self, limit=5):
+        self._schedule_sync()
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id, fields FROM notes ORDER BY created_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [_to_note(*row) for row in rows]
+
+    def get_note(self, note_id):
+        """Return a note, reading through to Airtable if it isn't replicated yet."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, fields FROM notes WHERE id = ?", (note_id,)
+            ).fetchone()
+            if row:
+                return _to_note(*row)
+
+            record = self.airtable.get(note_id)
+            if not record or "fields" not in record:
+                return None
+            with conn:
+                self._upsert(conn, record)
+            return {"id": record["id"], **record["fields"]}
+
+    def note_hashes(self):
+        """note_hash of every replicated note by id, newest first."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id, fields FROM notes ORDER BY created_at DESC, id DESC"
+            ).fetchall()
+        return {note_id: note_hash(json.loads(fields)) for note_id, fields in rows}
+
+    def get_briefs(self, note_ids):
+        """id, Title and Category of the given notes, in the given order."""
+        if not note_ids:
+            return []
+        placeholders = ", ".join("?" * len(note_ids))
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT id, title, category FROM notes WHERE id IN ({placeholders})",
+                list(note_ids),
+            ).fetchall()
+        by_id = {
+            note_id: {"id": note_id, "Title": title, "Category": category}
+            for note_id, title, category in rows
+        }
+        return [by_id[note_id] for note_id in note_ids if note_id in by_id]
+
+    # --- Summaries ---
+    def get_summary(self, note_id, html_content):
+        """Cached summary of the note, or None if missing or the content changed."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT summary FROM summaries WHERE note_id = ? AND content_hash = ?",
+                (note_id, content_hash(html_content)),
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_summary(self, note_id, html_content, summary):
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO summaries "
+                    "(note_id, content_hash, summary, created_at) VALUES (?, ?, ?, ?)",
+                    (note_id, content_hash(html_content), summary, time.time()),
+                )
+
+    # --- Writes ---
+    def insert(self, note_data):
+        """Insert a note into Airtable and the replica; returns the Airtable record."""
+        record = self.airtable.insert(note_data)
+        with closing(self._connect()) as conn:
+            with conn:
+                self._upsert(conn, record)
+        return record
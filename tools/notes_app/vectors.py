@@ -0,0 +1,161 @@
+"""
+On-disk vector index of note embeddings for related notes and semantic search.
+
+Vectors are stored L2-normalized as one float32 matrix in a .npz file next to
+the note ids and the content hash each vector was computed from, so cosine
+similarity against every note is a single matrix-vector product and edited
+notes can be found and re-embedded. Writers take a file lock and re-read the file first, and
+readers reload it when another process has changed it.
+"""
+
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from sqlite_store import data_path
+
+INDEX_PATH = data_path("NOTES_VECTOR_INDEX_PATH", "note_vectors.npz")
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class VectorIndex:
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.ids = []
+        self.hashes = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self._positions = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    @contextmanager
+    def _file_lock(self):
+        with open(f"{self.path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with np.load(self.path) as data:
+            self.ids = data["ids"].tolist()
+            self.hashes = data["hashes"].tolist()
+            self.matrix = data["vectors"]
+        self._positions = {note_id: i for i, note_id in enumerate(self.ids)}
+        self._mtime = mtime
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            ids=np.array(self.ids),
+            hashes=np.array(self.hashes),
+            vectors=self.matrix,
+        )
+        os.replace(tmp_path, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def __contains__(self, note_id):
+        with self._lock:
+            self._reload_if_changed()
+            return note_id in self._positions
+
+    def stale(self, hashes_by_id):
+        """
+        The note ids (in the given order) with no embedding yet, or whose
+        embedding was computed from content with a different hash.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            return [
+                note_id
+                for note_id, content_hash in hashes_by_id.items()
+                if note_id not in self._positions
+                or self.hashes[self._positions[note_id]] != content_hash
+            ]
+
+    def add(self, note_id, vector, content_hash):
+        """Store (or replace) the embedding of a note and persist the index."""
+        self.add_many({note_id: vector}, {note_id: content_hash})
+
+    def add_many(self, vectors_by_id, hashes_by_id):
+        """Store (or replace) several embeddings, saving the index once."""
+        with self._lock, self._file_lock():
+            self._reload_if_changed()
+            new_vectors = []
+            for note_id, vector in vectors_by_id.items():
+                vector = _normalize(vector)
+                position = self._positions.get(note_id)
+                if position is not None:
+                    self.matrix[position] = vector
+                    self.hashes[position] = hashes_by_id[note_id]
+                else:
+                    self._positions[note_id] = len(self.ids)
+                    self.ids.append(note_id)
+                    self.hashes.append(hashes_by_id[note_id])
+                    new_vectors.append(vector)
+            if new_vectors:
+                new_rows = np.vstack(new_vectors)
+                if self.matrix.size == 0:
+                    self.matrix = new_rows
+                else:
+                    self.matrix = np.vstack([self.matrix, new_rows])
+            self._save()
+
+    def retain(self, note_ids):
+        """Drop the embeddings of notes not in `note_ids`; returns how many."""
+        note_ids = set(note_ids)
+        with self._lock, self._file_lock():
+            self._reload_if_changed()
+            keep = [i for i, note_id in enumerate(self.ids) if note_id in note_ids]
+            removed = len(self.ids) - len(keep)
+            if removed:
+                self.ids = [self.ids[i] for i in keep]
+                self.hashes = [self.hashes[i] for i in keep]
+                self.matrix = self.matrix[keep]
+                self._positions = {note_id: i for i, note_id in enumerate(self.ids)}
+                self._save()
+        return removed
+
+    def top_k(self, vector, k=5, exclude=()):
+        """Return [(note_id, cosine similarity)] of the k most similar notes."""
+        with self._lock:
+            self._reload_if_changed()
+            ids, matrix, positions = self.ids, self.matrix, self._positions
+        if not ids:
+            return []
+
+        scores = matrix @ _normalize(vector)
+        for note_id in exclude:
+            if note_id in positions:
+                scores[positions[note_id]] = -np.inf
+        k = min(k, len(ids))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(ids[i], float(scores[i])) for i in best if np.isfinite(scores[i])]
+
+    def related(self, note_id, k=5):
+        """Notes most similar to an already indexed note (excluding itself)."""
+        with self._lock:
+            self._reload_if_changed()
+            position = self._positions.get(note_id)
+            if position is None:
+                return []
+            vector = self.matrix[position]
+        return self.top_k(vector, k, exclude=(note_id,))
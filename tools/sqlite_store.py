@@ -0,0 +1,47 @@
+"""
+SQLite databases under tools/data shared by the apps' on-disk stores.
+
+Stores open a short-lived connection per call. Files use WAL mode so readers
+in other gunicorn workers aren't blocked by a writer, and each store's schema
+is created the first time a process connects.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# Seconds to wait for another connection's write lock
+TIMEOUT = 30
+
+
+def data_path(env_var, filename):
+    """Path from `env_var`, defaulting to tools/data/<filename>."""
+    return os.environ.get(env_var, os.path.join(DATA_DIR, filename))
+
+
+class Database:
+    def __init__(self, path, schema, **connect_args):
+        self.path = path
+        self.schema = schema
+        self.connect_args = connect_args
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def ensure_schema(self):
+        """Create the directory, switch the file to WAL and apply the schema once."""
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with closing(sqlite3.connect(self.path, timeout=TIMEOUT)) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(self.schema)
+            self._ready = True
+
+    def connect(self):
+        self.ensure_schema()
+        return sqlite3.connect(self.path, timeout=TIMEOUT, **self.connect_args)
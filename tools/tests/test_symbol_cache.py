@@ -0,0 +1,33 @@
+import pytest
+
+from funds_app import symbol_cache
+from funds_app.names import TrigramMatcher
+from sqlite_store import Database
+
+GROWTH = "Parag Parikh Flexi Cap Fund Direct Plan Growth"
+IDCW = "Parag Parikh Flexi Cap Fund Direct Plan IDCW"
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        symbol_cache,
+        "_db",
+        Database(str(tmp_path / "symbols.sqlite3"), symbol_cache.SCHEMA),
+    )
+    monkeypatch.setattr(
+        symbol_cache, "_index", {"matcher": TrigramMatcher(), "loaded_at": 0.0}
+    )
+
+
+def test_fuzzy_hit_for_near_duplicate_name():
+    symbol_cache.store(GROWTH, "0P0000YWL1.BO")
+    assert symbol_cache.lookup("parag parikh flexicap fund direct plan growth") == (
+        True,
+        "0P0000YWL1.BO",
+    )
+
+
+def test_fuzzy_lookup_does_not_cross_plan_options():
+    symbol_cache.store(GROWTH, "0P0000YWL1.BO")
+    assert symbol_cache.lookup(IDCW) == (False, None)
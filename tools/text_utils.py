@@ -0,0 +1,107 @@
+"""
+Text normalization shared by the notes app and the local-tool scripts.
+
+Patterns are compiled once, and each helper makes a single regex pass for the
+tags; entity decoding and whitespace collapsing use str methods, which run
+in C, instead of further regex passes. The common entities are decoded with
+str.replace; html.unescape only runs when the text contains other ones.
+
+Run `python text_utils.py` for a micro-benchmark against the previous
+re.sub based helpers. clean_text is about 2x and strip_tags about 1.5x
+faster than the helpers they replaced; strip_tags is no faster than the bare
+tag re.sub summarize_with_openai used to do, which didn't decode entities.
+"""
+
+import html
+import re
+
+TAG = re.compile(r"<[^>]+>")
+# Any entity that the fast replace chain below doesn't handle
+OTHER_ENTITY = re.compile(r"&(?!(?:amp|lt|gt|quot|apos|#39|nbsp);)#?\w+;?")
+COMMON_ENTITIES = (
+    ("&lt;", "<"),
+    ("&gt;", ">"),
+    ("&quot;", '"'),
+    ("&apos;", "'"),
+    ("&#39;", "'"),
+    ("&nbsp;", "\xa0"),
+    # Last, so "&amp;lt;" decodes to "&lt;" and not "<"
+    ("&amp;", "&"),
+)
+
+
+def unescape(text):
+    """html.unescape, with a fast path for text that only has common entities."""
+    if "&" not in text:
+        return text
+    if OTHER_ENTITY.search(text):
+        return html.unescape(text)
+    for entity, char in COMMON_ENTITIES:
+        if entity in text:
+            text = text.replace(entity, char)
+    return text
+
+
+def strip_tags(html_content, separator=" "):
+    """
+    Plain text of an HTML fragment: tags replaced by `separator` and entities
+    decoded. Line breaks are kept, so paragraphs can still be told apart.
+    """
+    text = html_content or ""
+    if "<" in text:
+        text = TAG.sub(separator, text)
+    return unescape(text)
+
+
+def clean_text(text):
+    """
+    Remove tags, decode entities and collapse all whitespace (including
+    newlines and tabs) to single spaces, trimmed at both ends.
+    """
+    return " ".join(strip_tags(text, separator="").split())
+
+
+def _benchmark():
+    import random
+    import timeit
+
+    def legacy_clean_transcript(transcript_text):
+        transcript_text = re.sub(r"<[^>]+>", "", transcript_text)
+        transcript_text = re.sub(r"\s+", " ", transcript_text)
+        transcript_text = re.sub(r"[\r\n\t]", " ", transcript_text)
+        return transcript_text.strip()
+
+    # notes_app.replica.strip_tags
+    def legacy_strip_tags(html_content):
+        return html.unescape(re.sub(r"<[^<]+?>", " ", html_content or ""))
+
+    # Tag removal in notes_app.summarize_with_openai
+    def legacy_summary_text(html_content):
+        return re.sub("<[^<]+?>", "", html_content)
+
+    random.seed(0)
+    words = ["the", "cluster", "pods", "[Music]", "it&#39;s", "a &amp; b", "\n"]
+    transcript = " ".join(random.choice(words) for _ in range(500_000))
+    note = "".join(
+        f"<h2>Section {i}</h2>\n<p>Text with <strong>tags</strong> &amp; "
+        f"<code>x &lt; y</code> entities.</p>\n"
+        for i in range(20_000)
+    )
+    cases = [
+        ("clean_transcript", transcript, legacy_clean_transcript, clean_text),
+        ("strip_tags", note, legacy_strip_tags, strip_tags),
+        ("summary_text", note, legacy_summary_text, strip_tags),
+    ]
+    for name, text, legacy, current in cases:
+        timings = []
+        for function in (legacy, current):
+            runs = timeit.repeat(lambda: function(text), number=5, repeat=3)
+            timings.append(min(runs) / 5 * 1000)
+        print(
+            f"{name:<18} {len(text) / 1e6:.1f} MB  legacy {timings[0]:7.1f} ms  "
+            f"text_utils {timings[1]:7.1f} ms  ({timings[0] / timings[1]:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    _benchmark()